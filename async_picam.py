@@ -0,0 +1,212 @@
+"""
+A module with an asyncio version of RemotePiCam, so one event loop can drive
+several cameras without a thread per blocking call.
+"""
+
+import asyncio
+import logging
+import struct
+from copy import deepcopy
+from typing import AsyncIterator, Optional, Union
+
+import networkzero as nw0
+
+from create_logger import create_logger
+from picam import DEFAULT_SETTINGS, HEADER_FORMAT, HEADER_SIZE, \
+    REPLY_TIMEOUT, Frame, get_ip_addr, send_message
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+
+class AsyncRemotePiCam:
+    """
+    A class to manage connecting, getting frames, and controlling a remote
+    PiCam with asyncio.
+
+    networkzero has no asyncio API, so discovery and settings messages are run
+    in the event loop's default executor. The video stream itself is read
+    with asyncio streams.
+    """
+
+    def __init__(self, cam_name: str, port: int):
+        """
+        Initiate the PiCam. This does not actually connect to the PiCam until
+        you await connect().
+
+        :param cam_name: The name of the PiCamera. This is used to discover
+         the camera.
+        :param port: The port to listen on.
+        """
+        self._cam_name = cam_name
+        self._cam_address = None
+        self._port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._accepted: Optional[asyncio.Future] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._settings_lock = asyncio.Lock()
+        self._connected = False
+        self.capabilities = {}
+        self.settings_version: Optional[int] = None
+        self.settings = deepcopy(DEFAULT_SETTINGS)
+
+    async def connect(self, timeout: int = 30) -> bool:
+        """
+        Actually connect to the PiCam.
+
+        :param timeout: Wait up to x amount of seconds before giving up.
+        :return: A bool on whether we successfully connected or not.
+        """
+        logger.debug(f"Attempting to connect to a PiCam with name "
+                     f"{self._cam_name}")
+        self.capabilities = {}
+        self.settings_version = None
+        loop = asyncio.get_running_loop()
+        try:
+            service = await loop.run_in_executor(None, nw0.discover,
+                                                 self._cam_name, timeout)
+        except nw0.core.SocketTimedOutError:
+            return False
+        if service is None:
+            logger.warning("Failed to find PiCam")
+            return False
+        logger.info(f"Successfully connected to PiCam '{self._cam_name}' "
+                    f"at address {service}")
+        logger.debug(f"Opening socket on port {self._port}")
+        self._accepted = loop.create_future()
+        self._server = await asyncio.start_server(self._on_connection,
+                                                  "0.0.0.0", self._port)
+        connected = False
+        try:
+            self._set_settings(await loop.run_in_executor(
+                None, send_message, service, get_ip_addr(), REPLY_TIMEOUT
+            ))
+            self._cam_address = service
+            self._reader, self._writer = await asyncio.wait_for(
+                self._accepted, timeout
+            )
+            connected = True
+        except (TimeoutError, asyncio.TimeoutError):
+            logger.warning("PiCam didn't reply or connect back in time")
+            return False
+        finally:
+            if not connected:
+                # Free the port, or the next connect() can't listen on it
+                await self.disconnect()
+        self._connected = True
+        return True
+
+    def _set_settings(self, settings: dict) -> None:
+        """
+        Set the settings from a PiCam reply. Newer PiCams also say what they
+        support in a "capabilities" key, which is kept separately so it is
+        never sent back to the PiCam.
+
+        :param settings: The settings dict from the PiCam.
+        :return: None.
+        """
+        if "capabilities" in settings:
+            self.capabilities = settings.pop("capabilities")
+            self.settings_version = self.capabilities.get("settings_version")
+        self.settings = settings
+
+    def supports(self, command: str) -> bool:
+        """
+        Get whether the PiCam understands a command.
+
+        :param command: The name of the command.
+        :return: A bool.
+        """
+        return command in self.capabilities.get("commands", [])
+
+    async def _on_connection(self, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> None:
+        """
+        Called by the server when the PiCam connects back to us.
+
+        :param reader: The asyncio.StreamReader of the connection.
+        :param writer: The asyncio.StreamWriter of the connection.
+        :return: None.
+        """
+        if self._accepted is None or self._accepted.done():
+            writer.close()
+            return
+        self._accepted.set_result((reader, writer))
+
+    async def get_frame(self) -> Union[Frame, None]:
+        """
+        Get a compressed frame from the PiCam.
+
+        :return: A Frame, or None if disconnected.
+        """
+        if not self.is_connected:
+            raise ValueError("Not connected")
+        try:
+            header = await self._reader.readexactly(HEADER_SIZE)
+            frame_time, img_len = struct.unpack(HEADER_FORMAT, header)
+            if img_len == 0:
+                raise ValueError("No more data is being sent, closing")
+            payload = await self._reader.readexactly(img_len)
+            return Frame(memoryview(payload), img_len, frame_time)
+        except Exception:
+            await self.disconnect()
+        return None
+
+    async def frames(self) -> AsyncIterator[Frame]:
+        """
+        Iterate over frames from the PiCam until we get disconnected.
+
+        :return: An async iterator of Frames.
+        """
+        while self.is_connected:
+            frame = await self.get_frame()
+            if frame is None:
+                break
+            yield frame
+
+    async def update_settings(self) -> bool:
+        """
+        Update the settings.
+
+        :return: A bool on whether the settings were set or not.
+        :raises TimeoutError: If the PiCam didn't reply within REPLY_TIMEOUT
+         seconds.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._settings_lock:
+            result = await loop.run_in_executor(None, send_message,
+                                                self._cam_address,
+                                                self.settings, REPLY_TIMEOUT)
+        self._set_settings(result[1])
+        return result[0]
+
+    async def disconnect(self) -> None:
+        """
+        Disconnect.
+
+        :return: None.
+        """
+        logger.warning("Disconnecting")
+        self._connected = False
+        if self._writer is not None:
+            writer = self._writer
+            self._writer = None
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                # The PiCam may have already reset the connection
+                pass
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def is_connected(self) -> bool:
+        """
+        Get whether we are currently connected to a PiCam or not.
+
+        :return: A bool.
+        """
+        return self._connected
@@ -0,0 +1,349 @@
+"""
+A module that benchmarks the frame pipeline from the socket to a frame that
+is ready to show, against a local PiCam simulator.
+
+Run it with `python benchmark.py` and it will print the results as JSON. Run
+`python benchmark.py --help` for all the options.
+"""
+
+import json
+import logging
+import queue
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from queue import Queue
+from time import time as unix, sleep, perf_counter, process_time
+from typing import Optional
+
+from camera_hub import CameraHub
+from clock_sync import ClockSync
+from create_logger import create_logger
+from frame_buffer import FrameBuffer, POLICIES
+from frame_pipeline import FramePipeline
+from metrics import percentile
+from picam import DEFAULT_SETTINGS, Frame, RemotePiCam
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = create_logger(name=__name__, level=logging.INFO)
+
+
+def peak_rss_kb() -> Optional[int]:
+    """
+    Get the peak resident set size of this process so far.
+
+    :return: The peak RSS in kilobytes, or None if it can't be measured here.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class Benchmark:
+    """
+    Runs the viewer's ingest, frame buffer, decode and display queue against
+    a PiCam with a range of resolutions and buffer settings.
+    """
+
+    def __init__(self, cam: RemotePiCam, display_size: tuple[int, int],
+                 decode_workers: int = 1, budget: int = 16 * 1024 * 1024,
+                 playout_delay: float = 100,
+                 clock: Optional[ClockSync] = None):
+        """
+        Initiate the benchmark.
+
+        :param cam: A connected RemotePiCam.
+        :param display_size: The size frames are prepared for, like the
+         screen size in the viewer.
+        :param decode_workers: How many threads to decode with.
+        :param budget: The most bytes of compressed frames to buffer.
+        :param playout_delay: How many milliseconds the "jitter" policy holds
+         frames for.
+        :param clock: A ClockSync to turn frame times into our time with, so
+         latencies don't include how far off the PiCam's clock is, or None
+         if the PiCam shares our clock.
+        """
+        self.cam = cam
+        self.display_size = display_size
+        self.decode_workers = decode_workers
+        self.budget = budget
+        self.playout_delay = playout_delay
+        self.clock = clock
+        self._pipeline: Optional[FramePipeline] = None
+        self._hub = CameraHub()
+        self._hub.start()
+        self._hub.add(cam, self._on_frame, lambda: None)
+
+    def _on_frame(self, frame: Frame) -> None:
+        """
+        Give a frame from the hub to the current pipeline.
+
+        :param frame: A Frame.
+        :return: None.
+        """
+        if self.clock is not None:
+            frame.local_time = self.clock.to_local(frame.frame_time)
+        pipeline = self._pipeline
+        if pipeline is None:
+            frame.release()
+        else:
+            pipeline.submit(frame)
+
+    def set_resolution(self, resolution: str) -> bool:
+        """
+        Ask the PiCam to stream at a resolution.
+
+        :param resolution: A resolution like "1920x1080".
+        :return: A bool on whether the PiCam accepted it.
+        """
+        self.cam.settings["resolution"]["selected"] = \
+            tuple(int(p) for p in resolution.split("x"))
+        return self.cam.update_settings()
+
+    def available_resolutions(self) -> list[str]:
+        """
+        Get the resolutions the PiCam says it can stream at, or the default
+        ones if it doesn't say.
+
+        :return: A list of resolutions like "1920x1080".
+        """
+        available = self.cam.settings.get("resolution", {}).get("available")
+        if not available:
+            available = DEFAULT_SETTINGS["resolution"]["available"]
+        return list(available)
+
+    def run(self, policy: str, buffer_size: int, queue_check: int,
+            duration: float, warmup: float) -> dict:
+        """
+        Run the pipeline for a while and measure it. Compressed frames go
+        through a frame buffer before they are decoded into a two slot image
+        queue, like in the viewer. The newest frame is taken out of the image
+        queue every queue_check milliseconds, like the viewer does when it
+        can't be woken up by the pipeline.
+
+        :param policy: The frame buffer policy, "latest" or "jitter".
+        :param buffer_size: The most compressed frames to buffer.
+        :param queue_check: How many milliseconds between queue checks.
+        :param duration: How many seconds to measure for.
+        :param warmup: How many seconds to run before measuring.
+        :return: A dict of the results.
+        """
+        frame_buffer = FrameBuffer(buffer_size, policy, self.playout_delay,
+                                   self.budget)
+        image_queue = Queue(maxsize=2)
+        pipeline = FramePipeline(image_queue, workers=self.decode_workers,
+                                 input_buffer=frame_buffer)
+        pipeline.target_size = self.display_size
+        pipeline.keep_payload = True
+        pipeline.start()
+        self._pipeline = pipeline
+        latencies = []
+        shown = 0
+        skipped = 0
+        dropped = 0
+        start = perf_counter()
+        measure_start = start + warmup
+        cpu_start = None
+        while perf_counter() - start < warmup + duration:
+            sleep(queue_check / 1000)
+            if cpu_start is None and perf_counter() >= measure_start:
+                cpu_start = process_time()
+                shown = 0
+                skipped = 0
+                # Only count the drops from now on, like the frames shown
+                dropped = -self._drops(pipeline, frame_buffer)
+                latencies.clear()
+            frame = None
+            while True:
+                try:
+                    newer = image_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if frame is not None:
+                    frame.release()
+                    skipped += 1
+                frame = newer
+            if frame is None:
+                continue
+            # Stand in for making the Tk PhotoImage, which needs a display
+            frame.image.tobytes()
+            frame.release()
+            captured = frame.local_time if frame.local_time is not None \
+                else frame.frame_time
+            latencies.append(round(unix() * 1000 - captured, 2))
+            shown += 1
+        cpu_used = process_time() - (cpu_start or process_time())
+        dropped += self._drops(pipeline, frame_buffer)
+        self._pipeline = None
+        pipeline.stop()
+        frame_buffer.clear()
+        return {
+            "fps": round(shown / duration, 2),
+            "frames_shown": shown,
+            "frames_dropped": dropped + skipped,
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99)
+            },
+            "cpu_ms_per_frame": round(cpu_used * 1000 / shown, 3)
+            if shown > 0 else None,
+            "peak_rss_kb": peak_rss_kb()
+        }
+
+    @staticmethod
+    def _drops(pipeline: FramePipeline, frame_buffer: FrameBuffer) -> int:
+        """
+        Count the frames the pipeline and frame buffer dropped so far.
+
+        :param pipeline: The FramePipeline.
+        :param frame_buffer: The FrameBuffer of the pipeline.
+        :return: An int.
+        """
+        return pipeline.dropped_frames + pipeline.late_frames + \
+            sum(frame_buffer.dropped.values()) + \
+            sum(frame_buffer.late.values())
+
+    def sweep(self, resolutions: list[str], policies: list[str],
+              buffer_sizes: list[int], queue_checks: list[int],
+              duration: float, warmup: float) -> list[dict]:
+        """
+        Run the benchmark for every combination of resolution and buffer
+        settings.
+
+        :param resolutions: A list of resolutions like "1920x1080".
+        :param policies: A list of frame buffer policies.
+        :param buffer_sizes: A list of frame buffer sizes in frames.
+        :param queue_checks: A list of queue check intervals in milliseconds.
+        :param duration: How many seconds to measure each run for.
+        :param warmup: How many seconds to run before measuring each run.
+        :return: A list of result dicts.
+        """
+        results = []
+        for resolution in resolutions:
+            if not self.set_resolution(resolution):
+                logger.warning(f"PiCam rejected resolution {resolution}")
+                continue
+            for policy in policies:
+                for buffer_size in buffer_sizes:
+                    for queue_check in queue_checks:
+                        if not self.cam.is_connected:
+                            raise ConnectionError("Lost connection to PiCam")
+                        logger.info(f"Running {resolution} with the "
+                                    f"{policy} policy, buffer size "
+                                    f"{buffer_size}, checked every "
+                                    f"{queue_check} ms")
+                        result = {
+                            "resolution": resolution,
+                            "policy": policy,
+                            "buffer_size": buffer_size,
+                            "queue_check": queue_check
+                        }
+                        result |= self.run(policy, buffer_size, queue_check,
+                                           duration, warmup)
+                        results.append(result)
+        return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the Remote PiCam Viewer "
+                                        "frame pipeline.")
+    parser.add_argument("--name", default="benchmark",
+                        help="the name of the PiCam to benchmark against "
+                             "(default: benchmark)")
+    parser.add_argument("--port", type=int, default=7897,
+                        help="the port to listen on (default: 7897)")
+    parser.add_argument("--no-simulator", action="store_true",
+                        help="don't start a local simulator, use a PiCam "
+                             "that is already running")
+    parser.add_argument("--fps", type=float, default=30,
+                        help="frames per second for the simulator "
+                             "(default: 30)")
+    parser.add_argument("--resolutions", nargs="*", default=None,
+                        help="the resolutions to test (default: every "
+                             "resolution the PiCam says it supports)")
+    parser.add_argument("--policies", nargs="*", default=list(POLICIES),
+                        choices=POLICIES,
+                        help="the frame buffer policies to test (default: "
+                             "latest jitter)")
+    parser.add_argument("--buffer-sizes", nargs="*", type=int,
+                        default=[1, 8, 32],
+                        help="the frame buffer sizes to test in frames, "
+                             "like gui.queue.size (default: 1 8 32)")
+    parser.add_argument("--budget", type=int, default=16 * 1024 * 1024,
+                        help="the most bytes of compressed frames to buffer, "
+                             "like gui.buffer.budget (default: 16777216)")
+    parser.add_argument("--playout-delay", type=float, default=100,
+                        help="how many milliseconds the jitter policy holds "
+                             "frames for (default: 100)")
+    parser.add_argument("--queue-checks", nargs="*", type=int,
+                        default=[10, 50],
+                        help="the queue check intervals to test in "
+                             "milliseconds (default: 10 50)")
+    parser.add_argument("--decode-workers", type=int, default=1,
+                        help="how many threads to decode with (default: 1)")
+    parser.add_argument("--display", default="1920x1080",
+                        help="the size to prepare frames for "
+                             "(default: 1920x1080)")
+    parser.add_argument("--duration", type=float, default=3,
+                        help="how many seconds to measure each run for "
+                             "(default: 3)")
+    parser.add_argument("--warmup", type=float, default=1,
+                        help="how many seconds to run before measuring each "
+                             "run (default: 1)")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="a file to write the JSON results to (default: "
+                             "print them)")
+    args = parser.parse_args()
+    simulator = None
+    if not args.no_simulator:
+        logger.info("Starting simulator")
+        simulator = subprocess.Popen([
+            sys.executable, str(Path(__file__).parent / "simulator.py"),
+            "--name", args.name, "--port", str(args.port),
+            "--fps", str(args.fps)
+        ])
+    try:
+        cam = RemotePiCam(args.name, args.port, 64)
+        if not cam.connect(timeout=30):
+            raise ConnectionError(f"Could not find PiCam {repr(args.name)}")
+        clock = ClockSync(cam)
+        # Measure the offset before the first run, and keep it fresh on the
+        # clock thread
+        clock.refresh()
+        clock.start()
+        benchmark = Benchmark(
+            cam, tuple(int(p) for p in args.display.split("x")),
+            args.decode_workers, args.budget, args.playout_delay, clock
+        )
+        results = {
+            "decode_workers": args.decode_workers,
+            "display": args.display,
+            "budget": args.budget,
+            "playout_delay": args.playout_delay,
+            "clock_synced": clock.synced,
+            "clock_error_ms": round(clock.error, 2) if clock.synced
+            else None,
+            "runs": benchmark.sweep(
+                args.resolutions or benchmark.available_resolutions(),
+                args.policies, args.buffer_sizes, args.queue_checks,
+                args.duration, args.warmup
+            )
+        }
+        clock.stop()
+        cam.close()
+    finally:
+        if simulator is not None:
+            simulator.terminate()
+    text = json.dumps(results, indent=4)
+    if args.output is not None:
+        args.output.write_text(text)
+    else:
+        print(text)
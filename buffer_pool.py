@@ -0,0 +1,81 @@
+"""
+A module that keeps a pool of reusable buffers that frames can be read into,
+so we don't allocate a new buffer for every frame.
+"""
+
+import logging
+from threading import Lock
+
+from create_logger import create_logger
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+
+class BufferPool:
+    """
+    A thread-safe pool of reusable bytearrays.
+
+    Buffers are only allocated once frames need them, and up to count of them
+    are kept for reuse once they are given back, so a pool never holds more
+    memory than the frames actually in flight needed.
+    """
+
+    def __init__(self, count: int = 8, slot_size: int = 64 * 1024):
+        """
+        Initiate the pool.
+
+        :param count: How many buffers to keep around at most.
+        :param slot_size: The size of each buffer in bytes. This will grow by
+         itself if a bigger buffer is ever requested.
+        """
+        self._lock = Lock()
+        self._count = count
+        self._slot_size = slot_size
+        self._free: list[bytearray] = []
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, size: int) -> bytearray:
+        """
+        Get a buffer that is at least size bytes big. If there are no free
+        buffers big enough, a new one will be allocated and counted as a miss,
+        which is how the pool fills up.
+
+        :param size: The minimum size of the buffer in bytes.
+        :return: A bytearray. Give it back with release() when you are done.
+        """
+        with self._lock:
+            if size <= self._slot_size and len(self._free) > 0:
+                self.hits += 1
+                return self._free.pop()
+            self.misses += 1
+            if size > self._slot_size:
+                # Frames got bigger (probably the resolution went up) so all
+                # of the old buffers are too small now
+                self._slot_size = round(size * 1.25)
+                logger.debug(f"Growing buffer pool slot size to "
+                             f"{self._slot_size} bytes")
+                self._free.clear()
+            return bytearray(self._slot_size)
+
+    def release(self, buffer: bytearray) -> None:
+        """
+        Give a buffer back to the pool.
+
+        :param buffer: A bytearray previously returned by acquire().
+        :return: None.
+        """
+        with self._lock:
+            if len(buffer) >= self._slot_size and \
+                    len(self._free) < self._count:
+                self._free.append(buffer)
+
+    @property
+    def free(self) -> int:
+        """
+        Get how many buffers are waiting to be reused.
+
+        :return: An int.
+        """
+        with self._lock:
+            return len(self._free)
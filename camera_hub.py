@@ -0,0 +1,170 @@
+"""
+A module that reads the streams of many PiCams on a single thread with the
+selectors module.
+"""
+
+import logging
+import selectors
+from socket import socketpair
+from threading import Thread, Lock, Event, current_thread
+from typing import Callable, Optional
+
+from create_logger import create_logger
+from picam import Frame, RemotePiCam
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+
+class CameraStats:
+    """
+    Per-camera counters kept by the CameraHub.
+    """
+
+    def __init__(self):
+        """
+        Initiate the stats with everything at zero.
+        """
+        self.frames = 0
+        self.bytes = 0
+
+
+class CameraHub:
+    """
+    Reads frames from any number of connected RemotePiCams on one thread and
+    hands them to a callback per camera.
+    """
+
+    def __init__(self):
+        """
+        Initiate the hub. Call start() to start reading.
+        """
+        self._selector = selectors.DefaultSelector()
+        self._lock = Lock()
+        self._pending: list[tuple[str, RemotePiCam, tuple]] = []
+        self._wakeup_recv, self._wakeup_send = socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        self.stats: dict[RemotePiCam, CameraStats] = {}
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        """
+        Start the ingest thread.
+
+        :return: None.
+        """
+        logger.debug("Spawning camera hub thread")
+        self._thread = Thread(target=self._run, name="Camera hub",
+                              daemon=True)
+        self._thread.start()
+
+    def add(self, cam: RemotePiCam, on_frame: Callable[[Frame], None],
+            on_disconnect: Callable[[], None],
+            reset_stats: bool = True) -> None:
+        """
+        Start reading from a connected PiCam.
+
+        :param cam: A connected RemotePiCam.
+        :param on_frame: A function that gets called on the hub thread with
+         every Frame. It takes care of releasing the frame.
+        :param on_disconnect: A function that gets called on the hub thread
+         if the connection fails. It must not wait for a thread that may be
+         in remove(), like a GUI thread, or the two wait for each other
+         forever.
+        :param reset_stats: Whether to reset the stats of the PiCam if it was
+         added before, like after reconnecting.
+        :return: None.
+        """
+        logger.debug(f"Adding PiCam {repr(cam.name)} to camera hub")
+        if reset_stats or cam not in self.stats:
+            self.stats[cam] = CameraStats()
+        self._queue_change("add", cam, (on_frame, on_disconnect))
+
+    def remove(self, cam: RemotePiCam) -> None:
+        """
+        Stop reading from a PiCam. Do this before disconnecting it. This
+        waits until the hub thread is done with the PiCam, so it is safe to
+        close its connection once this returns.
+
+        :param cam: A RemotePiCam previously added with add().
+        :return: None.
+        """
+        logger.debug(f"Removing PiCam {repr(cam.name)} from camera hub")
+        if current_thread() is self._thread:
+            self._unregister(cam)
+            return
+        removed = Event()
+        self._queue_change("remove", cam, (removed, ))
+        if self._thread is not None:
+            removed.wait()
+
+    def _queue_change(self, action: str, cam: RemotePiCam,
+                      args: tuple) -> None:
+        """
+        Queue a change to the selector and wake up the hub thread to apply it,
+        because the selector should only be touched from the hub thread.
+
+        :param action: "add" or "remove".
+        :param cam: The RemotePiCam.
+        :param args: Extra arguments for the action.
+        :return: None.
+        """
+        with self._lock:
+            self._pending.append((action, cam, args))
+        self._wakeup_send.send(b"\0")
+
+    def _apply_changes(self) -> None:
+        """
+        Apply queued changes to the selector.
+
+        :return: None.
+        """
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        for action, cam, args in pending:
+            if action == "add":
+                cam.set_blocking(False)
+                self._selector.register(cam, selectors.EVENT_READ, args)
+            else:
+                self._unregister(cam)
+                args[0].set()
+
+    def _unregister(self, cam: RemotePiCam) -> None:
+        """
+        Stop watching a PiCam, even if its socket is already closed.
+
+        :param cam: The RemotePiCam.
+        :return: None.
+        """
+        for key in list(self._selector.get_map().values()):
+            if key.fileobj is cam:
+                self._selector.unregister(cam)
+                break
+
+    def _run(self) -> None:
+        """
+        Keep reading from all the PiCams.
+
+        :return: None.
+        """
+        while True:
+            for key, _ in self._selector.select():
+                if key.fileobj is self._wakeup_recv:
+                    self._apply_changes()
+                    continue
+                cam = key.fileobj
+                on_frame, on_disconnect = key.data
+                stats = self.stats[cam]
+                for frame in cam.read_available():
+                    stats.frames += 1
+                    stats.bytes += frame.size
+                    on_frame(frame)
+                if not cam.is_connected:
+                    self._unregister(cam)
+                    on_disconnect()
@@ -0,0 +1,206 @@
+"""
+A module that estimates how far a PiCam's clock is from ours, so the frame
+times it sends can be turned into our time and latencies can be trusted.
+"""
+
+import logging
+from collections import deque
+from threading import Thread, Event, Lock
+from time import time as unix
+from typing import Optional
+
+from create_logger import create_logger
+from picam import RemotePiCam
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+
+class ClockSync:
+    """
+    Estimates the offset and drift of a PiCam's clock from ours with NTP
+    style exchanges over the settings channel, refreshed every interval
+    seconds on a worker thread.
+
+    Every refresh sends samples "time" commands. The PiCam replies with when
+    it got the command and when it replied, and the exchange with the
+    shortest round trip is kept, because it has the least network delay in
+    it. Half its round trip is how wrong the offset can be. The drift is
+    fitted from the offsets of the last history refreshes.
+    """
+
+    def __init__(self, cam: RemotePiCam, interval: float = 30,
+                 samples: int = 8, history: int = 20, timeout: float = 1):
+        """
+        Initiate the clock sync. Call start() to actually start syncing.
+
+        :param cam: The RemotePiCam to sync with.
+        :param interval: How many seconds between refreshes.
+        :param samples: How many exchanges to do every refresh.
+        :param history: How many refreshes to fit the drift from.
+        :param timeout: How many seconds to wait for every reply. Exchanges
+         that take longer are useless for the offset anyway.
+        """
+        self.cam = cam
+        self.interval = interval
+        self.samples = samples
+        self.timeout = timeout
+        self.refreshes = 0
+        self._offsets: deque[tuple[float, float]] = deque(maxlen=history)
+        self._offset: Optional[float] = None
+        self._offset_time = 0.0
+        self._error = 0.0
+        self._drift = 0.0
+        self._lock = Lock()
+        self._stop = Event()
+
+    def start(self) -> None:
+        """
+        Start the worker thread.
+
+        :return: None.
+        """
+        logger.debug(f"Spawning clock sync thread for PiCam "
+                     f"{repr(self.cam.name)}")
+        t = Thread(target=self._run, name=f"Clock {self.cam.name}",
+                   daemon=True)
+        t.start()
+
+    def stop(self) -> None:
+        """
+        Stop syncing.
+
+        :return: None.
+        """
+        self._stop.set()
+
+    def exchange(self) -> tuple[float, float]:
+        """
+        Do one exchange with the PiCam.
+
+        :return: A tuple of the offset of the PiCam's clock from ours and the
+         round trip, both in milliseconds.
+        :raises TimeoutError: If the PiCam didn't reply within timeout
+         seconds.
+        """
+        sent = unix() * 1000
+        picam_received, picam_sent = self.cam.get_time(self.timeout)
+        received = unix() * 1000
+        offset = ((picam_received - sent) + (picam_sent - received)) / 2
+        round_trip = (received - sent) - (picam_sent - picam_received)
+        return offset, max(round_trip, 0)
+
+    def refresh(self) -> bool:
+        """
+        Measure the offset again and update the drift.
+
+        :return: Whether the PiCam could be synced with.
+        """
+        if not self.cam.is_connected or not self.cam.supports("time"):
+            return False
+        best = None
+        for _ in range(self.samples):
+            try:
+                offset, round_trip = self.exchange()
+            except Exception as e:
+                logger.warning(f"Failed to get the time of PiCam "
+                               f"{repr(self.cam.name)}: {e}")
+                continue
+            if best is None or round_trip < best[1]:
+                best = offset, round_trip
+        if best is None:
+            return False
+        now = unix() * 1000
+        with self._lock:
+            self._offsets.append((now, best[0]))
+            self._offset = best[0]
+            self._offset_time = now
+            self._error = best[1] / 2
+            self._drift = self._fit_drift()
+        self.refreshes += 1
+        logger.debug(f"PiCam {repr(self.cam.name)} clock is "
+                     f"{round(best[0], 1)} ms ± {round(best[1] / 2, 1)} ms "
+                     f"off, drifting {round(self._drift * 1e6, 1)} ppm")
+        return True
+
+    def _fit_drift(self) -> float:
+        """
+        Fit a line through the measured offsets. Call with the lock held.
+
+        :return: How many milliseconds the offset changes by every
+         millisecond.
+        """
+        if len(self._offsets) < 3:
+            return 0.0
+        count = len(self._offsets)
+        mean_time = sum(t for t, _ in self._offsets) / count
+        mean_offset = sum(o for _, o in self._offsets) / count
+        spread = sum((t - mean_time) ** 2 for t, _ in self._offsets)
+        if spread == 0:
+            return 0.0
+        return sum((t - mean_time) * (o - mean_offset)
+                   for t, o in self._offsets) / spread
+
+    def _run(self) -> None:
+        """
+        Keep refreshing until stopped.
+
+        :return: None.
+        """
+        while not self._stop.is_set():
+            # Try again soon if the PiCam isn't connected yet
+            self._stop.wait(self.interval if self.refresh() else 1)
+
+    @property
+    def synced(self) -> bool:
+        """
+        Get whether the offset has been measured.
+
+        :return: A bool.
+        """
+        with self._lock:
+            return self._offset is not None
+
+    def offset(self, at: Optional[float] = None) -> float:
+        """
+        Get the offset of the PiCam's clock from ours, taking the drift into
+        account.
+
+        :param at: Our time in milliseconds since the epoch, or None for now.
+        :return: The offset in milliseconds, which is 0 if not synced.
+        """
+        if at is None:
+            at = unix() * 1000
+        with self._lock:
+            if self._offset is None:
+                return 0.0
+            return self._offset + self._drift * (at - self._offset_time)
+
+    @property
+    def error(self) -> float:
+        """
+        Get how many milliseconds the offset can be wrong by.
+
+        :return: A float.
+        """
+        with self._lock:
+            return self._error
+
+    @property
+    def drift(self) -> float:
+        """
+        Get how fast the PiCam's clock drifts from ours.
+
+        :return: The drift in parts per million.
+        """
+        with self._lock:
+            return self._drift * 1e6
+
+    def to_local(self, picam_time: float) -> float:
+        """
+        Turn a time from the PiCam's clock into our clock.
+
+        :param picam_time: The time in milliseconds since the epoch on the
+         PiCam's clock, like a frame time.
+        :return: The time in milliseconds since the epoch on our clock.
+        """
+        return picam_time - self.offset(picam_time)
@@ -0,0 +1,256 @@
+"""
+A module with the buffer that holds compressed frames until they should be
+decoded and shown, and decides which frame that is and when.
+"""
+
+import logging
+import queue
+from collections import deque
+from threading import Condition
+from time import time as unix
+from typing import Optional
+
+from create_logger import create_logger
+from picam import Frame
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+LATEST_ONLY = "latest"
+JITTER_BUFFER = "jitter"
+POLICIES = (LATEST_ONLY, JITTER_BUFFER)
+
+
+class FrameBuffer:
+    """
+    Holds compressed frames until they should be decoded and shown. It can be
+    used as the input of a FramePipeline, so only the frames that will be
+    shown get decoded.
+
+    With the "latest" policy only the newest frame is kept, for the lowest
+    latency. With the "jitter" policy frames are held so every frame is shown
+    playout_delay milliseconds after the fastest a frame has ever arrived,
+    which smooths out frames arriving unevenly. Frames that arrive after they
+    should have been shown are dropped as late.
+
+    The frames held never take more than budget bytes, or more than maxsize
+    frames. When over, the oldest frames are dropped.
+    """
+
+    def __init__(self, maxsize: int = 32, policy: str = LATEST_ONLY,
+                 playout_delay: float = 100, budget: int = 16 * 1024 * 1024,
+                 history: int = 120):
+        """
+        Initiate the buffer.
+
+        :param maxsize: The most frames to hold.
+        :param policy: "latest" or "jitter".
+        :param playout_delay: How many milliseconds to hold frames for with
+         the "jitter" policy.
+        :param budget: The most bytes of compressed frames to hold.
+        :param history: How many frame transit times to find the fastest in.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown buffer policy {repr(policy)}")
+        self.maxsize = maxsize
+        self.playout_delay = playout_delay
+        self.budget = budget
+        self.dropped = {p: 0 for p in POLICIES}
+        self.late = {p: 0 for p in POLICIES}
+        self._policy = policy
+        self._condition = Condition()
+        self._frames: deque[Frame] = deque()
+        self._bytes = 0
+        self._stops = 0
+        self._transit_times = deque(maxlen=history)
+
+    @property
+    def policy(self) -> str:
+        """
+        Get the buffering policy.
+
+        :return: "latest" or "jitter".
+        """
+        return self._policy
+
+    @policy.setter
+    def policy(self, new_policy: str) -> None:
+        """
+        Set the buffering policy.
+
+        :param new_policy: "latest" or "jitter".
+        :return: None.
+        """
+        if new_policy not in POLICIES:
+            raise ValueError(f"Unknown buffer policy {repr(new_policy)}")
+        with self._condition:
+            logger.debug(f"Switching buffer policy to {repr(new_policy)}")
+            self._policy = new_policy
+            if new_policy == LATEST_ONLY:
+                self._drop_older_than(len(self._frames) - 1)
+
+    def _pop(self) -> Frame:
+        """
+        Take out the oldest frame. Call with the lock held.
+
+        :return: A Frame.
+        """
+        frame = self._frames.popleft()
+        self._bytes -= frame.size
+        return frame
+
+    def _drop_older_than(self, index: int) -> None:
+        """
+        Drop and release every frame before an index. Call with the lock
+        held.
+
+        :param index: The index of the first frame to keep.
+        :return: None.
+        """
+        for _ in range(max(index, 0)):
+            self._pop().release()
+            self.dropped[self._policy] += 1
+
+    def _playout_time(self, frame: Frame) -> float:
+        """
+        Get when a frame should be shown with the "jitter" policy. Call with
+        the lock held.
+
+        :param frame: A Frame.
+        :return: The time in milliseconds since the epoch in our clock.
+        """
+        # The fastest transit has the least network delay in it, and also
+        # takes care of the PiCam's clock being different from ours
+        return frame.frame_time + min(self._transit_times) + \
+            self.playout_delay
+
+    def put_nowait(self, frame: Frame) -> None:
+        """
+        Add a compressed frame. This never blocks.
+
+        :param frame: A Frame.
+        :return: None.
+        """
+        now = unix() * 1000
+        with self._condition:
+            self._transit_times.append(now - frame.frame_time)
+            if self._policy == JITTER_BUFFER and \
+                    now > self._playout_time(frame):
+                self.late[self._policy] += 1
+                frame.release()
+                return
+            self._frames.append(frame)
+            self._bytes += frame.size
+            if self._policy == LATEST_ONLY:
+                self._drop_older_than(len(self._frames) - 1)
+            else:
+                self._drop_older_than(len(self._frames) - self.maxsize)
+            while self._bytes > self.budget and len(self._frames) > 1:
+                self._pop().release()
+                self.dropped[self._policy] += 1
+            self._condition.notify()
+
+    def put(self, frame: Optional[Frame]) -> None:
+        """
+        Add a compressed frame, or None to make one get() return None, which
+        is how a FramePipeline stops its workers.
+
+        :param frame: A Frame or None.
+        :return: None.
+        """
+        if frame is not None:
+            self.put_nowait(frame)
+            return
+        with self._condition:
+            self._stops += 1
+            self._condition.notify()
+
+    def _wait_time(self) -> Optional[float]:
+        """
+        Get how long until the next frame should be shown. Call with the lock
+        held.
+
+        :return: The number of milliseconds, or None if there are no frames.
+        """
+        if len(self._frames) == 0:
+            return None
+        if self._policy == LATEST_ONLY:
+            return 0
+        return max(self._playout_time(self._frames[0]) - unix() * 1000, 0)
+
+    def _take(self) -> Frame:
+        """
+        Take out the newest frame that should be shown now. Frames that were
+        due before it are dropped. Call with the lock held.
+
+        :return: A Frame.
+        """
+        now = unix() * 1000
+        if self._policy == LATEST_ONLY:
+            due = len(self._frames)
+        else:
+            due = 0
+            for frame in self._frames:
+                if self._playout_time(frame) > now:
+                    break
+                due += 1
+        self._drop_older_than(due - 1)
+        return self._pop()
+
+    def get(self) -> Optional[Frame]:
+        """
+        Wait until a frame should be shown and take it out.
+
+        :return: A Frame, or None if put(None) was called.
+        """
+        with self._condition:
+            while True:
+                if self._stops > 0:
+                    self._stops -= 1
+                    return None
+                wait = self._wait_time()
+                if wait == 0:
+                    return self._take()
+                self._condition.wait(None if wait is None else wait / 1000)
+
+    def get_nowait(self) -> Frame:
+        """
+        Take out the frame that should be shown now, if there is one.
+
+        :return: A Frame.
+        :raises queue.Empty: If there is no frame to show now.
+        """
+        with self._condition:
+            if self._wait_time() != 0:
+                raise queue.Empty
+            return self._take()
+
+    @property
+    def bytes(self) -> int:
+        """
+        Get how many bytes of compressed frames are being held.
+
+        :return: An int.
+        """
+        with self._condition:
+            return self._bytes
+
+    def qsize(self) -> int:
+        """
+        Get how many frames are being held.
+
+        :return: An int.
+        """
+        with self._condition:
+            return len(self._frames)
+
+    def clear(self) -> None:
+        """
+        Drop and release every frame, and forget the transit times, like
+        after reconnecting.
+
+        :return: None.
+        """
+        with self._condition:
+            while len(self._frames) > 0:
+                self._pop().release()
+            self._transit_times.clear()
@@ -0,0 +1,224 @@
+"""
+A module that prepares frames from the PiCam for display on a worker thread,
+so the Tk main thread only has to show them.
+"""
+
+import logging
+import queue
+from collections import deque
+from queue import Queue
+from threading import Thread, Lock, current_thread
+from time import perf_counter
+from typing import Callable, Optional
+
+from PIL import Image
+
+from create_logger import create_logger
+from picam import Frame
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+
+def put_dropping_oldest(q: Queue, frame: Frame) -> int:
+    """
+    Put a frame in a queue, and if the queue is full, drop (and release) the
+    oldest frame to make room.
+
+    :param q: The queue.Queue to put the frame in.
+    :param frame: The Frame to put in.
+    :return: How many frames were dropped.
+    """
+    dropped = 0
+    while True:
+        try:
+            q.put_nowait(frame)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait().release()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+class FramePipeline:
+    """
+    Takes compressed frames, fully decodes them to RGB on one or more worker
+    threads, and puts them in an output queue ready to be shown.
+
+    With more than one worker, frames are still delivered in the order of
+    their frame time. A frame that finishes decoding after a newer frame has
+    already been delivered is dropped instead of shown out of order.
+
+    If target_size is set, JPEGs are decoded at a reduced scale using the
+    decoder's DCT scaling, and then shrunk to fit inside target_size with the
+    resample filter, or also grown to fit if upscale is True. If crop is set
+    to the left, top, right and bottom edges of a region as fractions of the
+    frame, only that region is converted and scaled, for digital zoom. If
+    keep_payload is True, prepared frames keep their compressed payload so
+    the full resolution image can still be decoded later, and whoever takes
+    them out of the output queue has to release them. If on_output is set, it
+    is called on the worker thread after every frame put in the output queue.
+    """
+
+    def __init__(self, output: Queue, size: int = 4, workers: int = 1,
+                 input_buffer=None):
+        """
+        Initiate the pipeline. Call start() to actually start preparing
+        frames.
+
+        :param output: The queue.Queue to put prepared frames in.
+        :param size: How many frames can wait to be decoded before we start
+         dropping the oldest ones.
+        :param workers: How many threads to decode with. Pillow lets go of
+         the GIL while decoding, so more threads can use more cores.
+        :param input_buffer: A FrameBuffer to take frames to prepare from,
+         instead of a queue of size frames.
+        """
+        self.workers = max(workers, 1)
+        if input_buffer is None:
+            input_buffer = Queue(maxsize=max(size, self.workers * 2))
+        self.input = input_buffer
+        self.output = output
+        self.late_frames = 0
+        self.dropped_frames = 0
+        self.target_size: Optional[tuple[int, int]] = None
+        self.upscale = False
+        self.resample = Image.BILINEAR
+        self.crop: Optional[tuple[float, float, float, float]] = None
+        self.keep_payload = False
+        self.on_output: Optional[Callable[[], None]] = None
+        self._threads: list[Thread] = []
+        self._deliver_lock = Lock()
+        self._last_frame_time = 0
+        self._decode_times: dict[str, deque] = {}
+
+    def start(self) -> None:
+        """
+        Start the worker threads.
+
+        :return: None.
+        """
+        for i in range(self.workers):
+            name = f"Decoder {i + 1}"
+            logger.debug(f"Spawning frame preparation thread {repr(name)}")
+            self._decode_times[name] = deque(maxlen=240)
+            t = Thread(target=self._prepare_frames, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        """
+        Stop the worker threads.
+
+        :return: None.
+        """
+        for _ in self._threads:
+            self.input.put(None)
+        self._threads.clear()
+
+    def reset(self) -> None:
+        """
+        Forget the last delivered frame time, so frames from a new connection
+        aren't thrown away as late.
+
+        :return: None.
+        """
+        with self._deliver_lock:
+            self._last_frame_time = 0
+
+    def worker_fps(self) -> dict[str, int]:
+        """
+        Get how many frames each worker decoded in the last second.
+
+        :return: A dict of worker names to frames per second.
+        """
+        now = perf_counter()
+        return {name: sum(1 for t in list(times) if now - t <= 1)
+                for name, times in self._decode_times.items()}
+
+    def submit(self, frame: Frame) -> None:
+        """
+        Give a frame to the pipeline to prepare.
+
+        :param frame: A Frame. The pipeline takes care of releasing it.
+        :return: None.
+        """
+        self.dropped_frames += put_dropping_oldest(self.input, frame)
+
+    def prepare(self, frame: Frame) -> Frame:
+        """
+        Decode a frame and convert it to pixels that Tk can show right away.
+
+        :param frame: A Frame.
+        :return: The same Frame with its image attribute set.
+        """
+        frame.times["decoding"] = perf_counter()
+        target_size = self.target_size
+        crop = self.crop
+        image = frame.open()
+        if target_size is not None and image.format == "JPEG":
+            # Zoomed in frames are decoded at the same reduced scale as the
+            # whole frame and the region is scaled up, so zooming never
+            # decodes more pixels than not zooming, at the cost of some
+            # sharpness
+            image.draft("RGB", target_size)
+        if crop is not None:
+            left, top, right, bottom = crop
+            image = image.crop((round(left * image.width),
+                                round(top * image.height),
+                                round(right * image.width),
+                                round(bottom * image.height)))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        else:
+            image.load()
+        if target_size is not None:
+            scale = min(target_size[0] / image.width,
+                        target_size[1] / image.height)
+            if scale < 1 or (scale > 1 and self.upscale):
+                image = image.resize((max(round(image.width * scale), 1),
+                                      max(round(image.height * scale), 1)),
+                                     self.resample)
+        frame.image = image
+        frame.times["decoded"] = perf_counter()
+        return frame
+
+    def _prepare_frames(self) -> None:
+        """
+        Keep preparing frames until we are stopped.
+
+        :return: None.
+        """
+        while True:
+            frame = self.input.get()
+            if frame is None:
+                break
+            try:
+                self.prepare(frame)
+            except Exception as e:
+                logger.warning(f"Failed to decode frame: {e}")
+                frame.release()
+                continue
+            if not self.keep_payload:
+                frame.release()
+            self._decode_times[current_thread().name].append(perf_counter())
+            self._deliver(frame)
+
+    def _deliver(self, frame: Frame) -> None:
+        """
+        Put a prepared frame in the output queue, unless a newer frame has
+        already been put in.
+
+        :param frame: A prepared Frame.
+        :return: None.
+        """
+        with self._deliver_lock:
+            if frame.frame_time < self._last_frame_time:
+                self.late_frames += 1
+                frame.release()
+                return
+            self._last_frame_time = frame.frame_time
+            self.dropped_frames += put_dropping_oldest(self.output, frame)
+        if self.on_output is not None:
+            self.on_output()
@@ -0,0 +1,273 @@
+"""
+A command line client that connects to a PiCam and runs the ingest pipeline
+without a GUI, for capture boxes that don't have a display. It never imports
+Tk, so it starts fast and stays small.
+
+Run `python headless.py --name picam --record frames` to save every frame,
+or `python headless.py --help` for all the options.
+"""
+
+import logging
+from argparse import ArgumentParser
+from json import loads as load_json
+from pathlib import Path
+from threading import Event
+from time import perf_counter
+from typing import Optional
+
+from clock_sync import ClockSync
+from create_logger import create_logger
+from metrics import FrameMetrics
+from metrics_export import MetricsExporter, collect_camera_metrics
+from picam import CODEC_JPEG, Frame, RemotePiCam, apply_settings_diff
+from reconnect import ReconnectSupervisor
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+SETTINGS_PATH = Path.cwd() / "settings.json"
+
+
+class HeadlessClient:
+    """
+    Reads frames from a PiCam on the calling thread and hands them to the
+    sinks: saving every compressed frame to a directory, and/or saving the
+    newest frame to a file every so often. Frames are never decoded unless a
+    snapshot has to be converted to another format.
+    """
+
+    def __init__(self, cam: RemotePiCam, record: Optional[Path] = None,
+                 snapshot: Optional[Path] = None,
+                 snapshot_interval: float = 5,
+                 clock: Optional[ClockSync] = None,
+                 supervisor: Optional[ReconnectSupervisor] = None):
+        """
+        Initiate the client.
+
+        :param cam: The connected RemotePiCam to read from.
+        :param record: A directory to save every frame to, or None.
+        :param snapshot: A file to save the newest frame to, or None.
+        :param snapshot_interval: How many seconds between snapshots.
+        :param clock: A ClockSync to correct the frame times with, or None.
+        :param supervisor: A ReconnectSupervisor to reconnect with when the
+         connection drops, or None to stop instead.
+        """
+        self.cam = cam
+        self.record = record
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+        self.clock = clock
+        self.supervisor = supervisor
+        self.metrics = FrameMetrics()
+        self.frames = 0
+        self.bytes = 0
+        self._last_snapshot = 0.0
+        self._reconnected = Event()
+        self._stop = Event()
+        if self.record is not None:
+            self.record.mkdir(parents=True, exist_ok=True)
+
+    def stop(self) -> None:
+        """
+        Make run() return after the frame it is reading.
+
+        :return: None.
+        """
+        self._stop.set()
+        self._reconnected.set()
+
+    def _save_frame(self, frame: Frame) -> None:
+        """
+        Save a compressed frame to the record directory, named by its frame
+        time and sequence number.
+
+        :param frame: A Frame.
+        :return: None.
+        """
+        number = frame.sequence if frame.sequence is not None else self.frames
+        path = self.record / f"{frame.frame_time}-{number}.jpg"
+        with path.open("wb") as file:
+            file.write(frame.payload)
+
+    def _save_snapshot(self, frame: Frame) -> None:
+        """
+        Save a frame to the snapshot file, replacing it all at once so
+        nothing ever reads half a snapshot.
+
+        :param frame: A Frame.
+        :return: None.
+        """
+        partial = self.snapshot.with_name(f".{self.snapshot.name}")
+        if self.snapshot.suffix.lower() in (".jpg", ".jpeg") and \
+                frame.codec == CODEC_JPEG:
+            with partial.open("wb") as file:
+                file.write(frame.payload)
+        else:
+            image = frame.open()
+            image.save(partial, format=image.format if
+                       self.snapshot.suffix == "" else None)
+        partial.replace(self.snapshot)
+
+    def handle(self, frame: Frame) -> None:
+        """
+        Hand a frame to the sinks and release it.
+
+        :param frame: A Frame.
+        :return: None.
+        """
+        try:
+            if self.clock is not None:
+                frame.local_time = self.clock.to_local(frame.frame_time)
+            self.metrics.received(frame)
+            self.frames += 1
+            self.bytes += frame.size
+            if self.record is not None:
+                self._save_frame(frame)
+            now = perf_counter()
+            if self.snapshot is not None and \
+                    now - self._last_snapshot >= self.snapshot_interval:
+                self._last_snapshot = now
+                self._save_snapshot(frame)
+            frame.times["rendered"] = perf_counter()
+            self.metrics.record(frame)
+        finally:
+            frame.release()
+
+    def _wait_for_reconnect(self) -> bool:
+        """
+        Wait for the supervisor to reconnect to the PiCam.
+
+        :return: Whether we are connected again.
+        """
+        if self.supervisor is None:
+            return False
+        self._reconnected.clear()
+        self.supervisor.start(self._reconnected.set)
+        self._reconnected.wait()
+        return self.cam.is_connected and not self._stop.is_set()
+
+    def run(self, duration: float = 0, frames: int = 0) -> None:
+        """
+        Read and handle frames until stopped, the connection drops for good,
+        or a limit is reached.
+
+        :param duration: The most seconds to run for, or 0 for no limit.
+        :param frames: The most frames to handle, or 0 for no limit.
+        :return: None.
+        """
+        start = perf_counter()
+        while not self._stop.is_set():
+            if duration > 0 and perf_counter() - start >= duration:
+                break
+            if frames > 0 and self.frames >= frames:
+                break
+            frame = self.cam.get_frame()
+            if frame is None:
+                logger.warning(f"Lost connection to PiCam "
+                               f"{repr(self.cam.name)}")
+                if not self._wait_for_reconnect():
+                    break
+                continue
+            self.handle(frame)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Connect to a Remote PiCam and "
+                                        "save its stream without a GUI.")
+    parser.add_argument("--name", default="picam",
+                        help="the name of the PiCam (default: picam)")
+    parser.add_argument("--port", type=int, default=7896,
+                        help="the port to listen on (default: 7896)")
+    parser.add_argument("--address", default=None,
+                        help="the networkzero address of the PiCam, to skip "
+                             "discovering it")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="how many seconds to look for the PiCam for "
+                             "(default: 30)")
+    parser.add_argument("--settings", type=Path, default=None,
+                        help="a JSON file of PiCam settings to apply, like "
+                             "{\"brightness\": {\"value\": 60}}")
+    parser.add_argument("--profile", default=None,
+                        help="a profile from the viewer's settings file to "
+                             "apply")
+    parser.add_argument("--config", type=Path, default=SETTINGS_PATH,
+                        help="the viewer's settings file to read profiles "
+                             "from (default: settings.json)")
+    parser.add_argument("--record", type=Path, default=None,
+                        help="a directory to save every frame to")
+    parser.add_argument("--snapshot", type=Path, default=None,
+                        help="a file to save the newest frame to every "
+                             "--snapshot-interval seconds")
+    parser.add_argument("--snapshot-interval", type=float, default=5,
+                        help="how many seconds between snapshots "
+                             "(default: 5)")
+    parser.add_argument("--metrics", type=Path, default=None,
+                        help="a JSONL file to append metrics to")
+    parser.add_argument("--prometheus-port", type=int, default=None,
+                        help="a port to serve Prometheus metrics on "
+                             "localhost")
+    parser.add_argument("--metrics-interval", type=float, default=10,
+                        help="how many seconds between exporting metrics "
+                             "(default: 10)")
+    parser.add_argument("--no-reconnect", action="store_true",
+                        help="stop instead of reconnecting when the "
+                             "connection drops")
+    parser.add_argument("--duration", type=float, default=0,
+                        help="how many seconds to run for (default: until "
+                             "stopped)")
+    parser.add_argument("--frames", type=int, default=0,
+                        help="how many frames to save (default: until "
+                             "stopped)")
+    args = parser.parse_args()
+    changes = {}
+    if args.profile is not None:
+        profiles = load_json(args.config.read_text()).get("profiles", {})
+        # Profile names are shown in the GUI, so they are usually capitalized
+        names = {name.casefold(): name for name in profiles}
+        if args.profile.casefold() not in names:
+            parser.error(f"No profile {repr(args.profile)} in {args.config}")
+        changes = profiles[names[args.profile.casefold()]]
+    if args.settings is not None:
+        apply_settings_diff(changes, load_json(args.settings.read_text()))
+    cam = RemotePiCam(args.name, args.port, 4, args.address)
+    if not cam.connect(timeout=args.timeout):
+        raise ConnectionError(f"Could not find PiCam {repr(args.name)}")
+    unknown = [key for key in changes if key not in cam.settings]
+    if len(unknown) > 0:
+        cam.close()
+        parser.error(f"Unknown settings: {', '.join(unknown)}")
+    if len(changes) > 0 and not cam.apply_changes(changes):
+        cam.close()
+        raise ValueError("PiCam did not accept the settings")
+    clock = ClockSync(cam)
+    clock.start()
+    client = HeadlessClient(
+        cam, args.record, args.snapshot, args.snapshot_interval, clock,
+        None if args.no_reconnect else ReconnectSupervisor(cam)
+    )
+    exporter = None
+    if args.metrics is not None or args.prometheus_port is not None:
+        def collect() -> dict[str, dict]:
+            values = collect_camera_metrics(cam, client.metrics,
+                                            supervisor=client.supervisor,
+                                            clock=clock)
+            values["frames_received"] = client.frames
+            return {cam.name: values}
+
+        exporter = MetricsExporter(collect, args.metrics_interval,
+                                   args.metrics, port=args.prometheus_port)
+        exporter.start()
+    try:
+        client.run(args.duration, args.frames)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.stop()
+        if client.supervisor is not None:
+            client.supervisor.stop()
+        clock.stop()
+        if exporter is not None:
+            exporter.export()
+            exporter.stop()
+        cam.close()
+        logger.info(f"Got {client.frames} frames "
+                    f"({round(client.bytes / 1024 / 1024, 2)} mb)")
@@ -1,12 +1,14 @@
-from time import time as unix
+from time import perf_counter
 import logging
+import math
 import queue
 import tkinter as tk
 import webbrowser
+import socket
 from json import loads as load_json, dumps as dump_json
 from pathlib import Path
 from queue import Queue
-from threading import Thread
+from threading import Thread, Lock
 from typing import Callable
 
 from PIL import ImageTk, Image
@@ -26,12 +28,201 @@ from TkZero.Text import Text, TextWrap
 from TkZero.Vector import Position
 from TkZero.Window import Window
 from TkZero.Scrollbar import Scrollbar, OrientModes
+from camera_hub import CameraHub
+from clock_sync import ClockSync
 from create_logger import create_logger
-from picam import RemotePiCam
+from frame_buffer import FrameBuffer, LATEST_ONLY, JITTER_BUFFER
+from frame_pipeline import FramePipeline
+from metrics import FrameMetrics, INTERVALS, PERCENTILES
+from metrics_export import MetricsExporter, collect_camera_metrics
+from pan_tilt import ServoController
+from picam import Frame as PiCamFrame, RemotePiCam
+from reconnect import ReconnectSupervisor
+from settings_worker import SettingsWorker
 
 logger = create_logger(name=__name__, level=logging.DEBUG)
 
 SETTINGS_PATH = Path.cwd() / "settings.json"
+MAX_ZOOM = 8
+RESAMPLE_FILTERS = {
+    "nearest": Image.NEAREST,
+    "bilinear": Image.BILINEAR,
+    "bicubic": Image.BICUBIC,
+    "lanczos": Image.LANCZOS
+}
+# The graphs in the stats window, with their label, unit and how to scale
+# their values to that unit
+SPARKLINES = [(name, name.title(), "ms", 1000) for name in INTERVALS] + [
+    ("fps", "Frames", "/s", 1),
+    ("mbps", "Bitrate", "Mbit/s", 1)
+]
+SPARKLINE_HEIGHT = 28
+
+
+def merge_settings(defaults: dict, settings: dict) -> dict:
+    """
+    Merge loaded settings on top of the defaults, so settings files from
+    older versions still get any new nested keys.
+
+    :param defaults: A dict of the default settings.
+    :param settings: A dict of the loaded settings.
+    :return: A new dict.
+    """
+    merged = dict(defaults)
+    for key, value in settings.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_settings(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class CameraTile:
+    """
+    Everything the GUI keeps for one PiCam: the camera, its frame pipeline,
+    and the stats and widgets of its tile in the grid.
+    """
+
+    def __init__(self, name: str, port: int, queue_size: int,
+                 decode_workers: int, address: str = None,
+                 reconnect: dict = None, servo_rate: float = 20,
+                 buffer: dict = None, clock_sync: dict = None):
+        """
+        Initiate the tile.
+
+        :param name: The name of the PiCam.
+        :param port: The port to listen on for the PiCam.
+        :param queue_size: The most compressed frames to buffer.
+        :param decode_workers: How many threads to decode frames with.
+        :param address: The address the PiCam was last found at, if any.
+        :param reconnect: The reconnect settings, with the keys
+         "initial_delay" and "max_delay".
+        :param servo_rate: The most pan/tilt commands to send per second.
+        :param buffer: The frame buffer settings, with the keys "policy",
+         "playout_delay" and "budget".
+        :param clock_sync: The clock sync settings, with the keys "interval"
+         and "samples".
+        """
+        buffer = buffer or {}
+        self.frame_buffer = FrameBuffer(
+            queue_size, buffer.get("policy", LATEST_ONLY),
+            buffer.get("playout_delay", 100),
+            buffer.get("budget", 16 * 1024 * 1024)
+        )
+        # Frames are buffered compressed, so only a couple of decoded frames
+        # ever wait to be shown
+        self.image_queue = Queue(maxsize=2)
+        self.pipeline = FramePipeline(self.image_queue,
+                                      workers=decode_workers,
+                                      input_buffer=self.frame_buffer)
+        self.pipeline.keep_payload = True
+        self.pipeline.start()
+        self.cam = RemotePiCam(name, port, queue_size + decode_workers + 4,
+                               address)
+        reconnect = reconnect or {}
+        self.supervisor = ReconnectSupervisor(
+            self.cam,
+            initial_delay=reconnect.get("initial_delay", 0.5),
+            max_delay=reconnect.get("max_delay", 30)
+        )
+        self.settings_worker = SettingsWorker(self.cam)
+        self.settings_worker.start()
+        self.servos = ServoController(self.cam, servo_rate)
+        self.servos.start()
+        clock_sync = clock_sync or {}
+        self.clock = ClockSync(self.cam, clock_sync.get("interval", 30),
+                               clock_sync.get("samples", 8))
+        self.clock.start()
+        self.drag_start = None
+        self.pan_start = None
+        self.zoom = 1.0
+        self.center = (0.5, 0.5)
+        self.wants_connection = False
+        self.paused = False
+        self.paused_upstream = False
+        self.curr_frame = None
+        self.curr_img = None
+        self.curr_img_size = 0
+        self.curr_img_time = 0
+        self.metrics = FrameMetrics()
+        self.frames_got = 0
+        self.frames_skipped = 0
+        self.image_label = None
+        self.caption_label = None
+        self.photo = None
+        self.photos_made = 0
+
+    def set_zoom(self, zoom: float, center: tuple[float, float]) -> None:
+        """
+        Digitally zoom into the frames of this tile. Frames are cropped
+        before they are converted and scaled, so zooming in costs less than
+        showing the whole frame.
+
+        :param zoom: How much to zoom in, from 1 to MAX_ZOOM.
+        :param center: The center of the view, as fractions of the frame
+         width and height.
+        :return: None.
+        """
+        self.zoom = min(max(zoom, 1), MAX_ZOOM)
+        half = 0.5 / self.zoom
+        center_x, center_y = (min(max(c, half), 1 - half) for c in center)
+        self.center = center_x, center_y
+        if self.zoom == 1:
+            self.pipeline.crop = None
+        else:
+            self.pipeline.crop = (center_x - half, center_y - half,
+                                  center_x + half, center_y + half)
+
+    def frame_point(self, x: int, y: int) -> tuple[float, float]:
+        """
+        Find where a point on the shown image is in the whole frame.
+
+        :param x: The x position on the shown image.
+        :param y: The y position on the shown image.
+        :return: A tuple of the x and y as fractions of the frame width and
+         height.
+        """
+        half = 0.5 / self.zoom
+        width = max(self.photo.width(), 1)
+        height = max(self.photo.height(), 1)
+        return (self.center[0] - half + min(max(x / width, 0), 1) / self.zoom,
+                self.center[1] - half + min(max(y / height, 0), 1) / self.zoom)
+
+    def show_image(self, image: Image.Image) -> None:
+        """
+        Show an image in the tile. The same Tk photo image is reused and its
+        pixels replaced, and only remade when the size of the image changes.
+
+        :param image: A PIL.Image.
+        :return: None.
+        """
+        if self.photo is not None and \
+                (self.photo.width(), self.photo.height()) == image.size:
+            self.photo.paste(image)
+            return
+        logger.debug(f"Making {image.size[0]}x{image.size[1]} photo image "
+                     f"for PiCam {repr(self.cam.name)}")
+        self.photo = ImageTk.PhotoImage(image)
+        self.photos_made += 1
+        self.image_label.image = self.photo
+
+    def on_frame(self, frame: PiCamFrame) -> None:
+        """
+        Called by the camera hub with every frame from this PiCam.
+
+        :param frame: A Frame.
+        :return: None.
+        """
+        # Frame times are in the PiCam's clock, which is never quite ours.
+        # They are left alone for ordering and buffering, which only need
+        # the PiCam's clock to be steady, and would break if the frame times
+        # jumped whenever the offset is measured again
+        frame.local_time = self.clock.to_local(frame.frame_time)
+        self.metrics.received(frame)
+        if self.paused:
+            frame.release()
+        else:
+            self.pipeline.submit(frame)
 
 
 class RemotePiCamGUI(MainWindow):
@@ -40,19 +231,46 @@ class RemotePiCamGUI(MainWindow):
         self.stop_try = False
         self.settings = {}
         self.load_settings()
-        self.image_queue = Queue(maxsize=self.settings["gui"]["queue"]["size"])
-        self.curr_img = None
-        self.curr_img_size = 0
-        self.curr_img_time = 0
-        self.last_frame_reset = 0
-        self.frames_this_sec = 0
-        self.stream_fps = 0
-        self.frames_got = 0
-        self.cam = RemotePiCam(self.settings["camera"]["name"],
-                               self.settings["camera"]["port"])
+        self.tiles = [
+            CameraTile(camera["name"], camera["port"],
+                       self.settings["gui"]["queue"]["size"],
+                       self.settings["gui"]["decode"]["workers"],
+                       camera.get("address"), self.settings["reconnect"],
+                       self.settings["gui"]["pan_tilt"]["rate"],
+                       self.settings["gui"]["buffer"],
+                       self.settings["clock_sync"])
+            for camera in self.settings["cameras"]
+        ]
+        self.selected_index = 0
+        self.hub = CameraHub()
+        self.hub.start()
+        self.exporter = None
+        export = self.settings["metrics"]
+        if export["file"] is not None or export["prometheus_port"] is not None:
+            self.exporter = MetricsExporter(
+                self.collect_metrics, export["interval"],
+                None if export["file"] is None else Path(export["file"]),
+                export["max_size"], export["backups"],
+                export["prometheus_port"]
+            )
+            self.exporter.start()
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_lock = Lock()
+        self._wakeup_pending = False
+        for tile in self.tiles:
+            tile.pipeline.on_output = self.frame_ready
         super().__init__()
+        viewport = self.settings["gui"]["viewport"]
+        resample = RESAMPLE_FILTERS[viewport["resample"]]
+        width, height = viewport["width"], viewport["height"]
+        for tile in self.tiles:
+            tile.pipeline.upscale = True
+            tile.pipeline.resample = resample
+            tile.pipeline.target_size = self.tile_display_size(width, height)
+        self._moving_timer = None
         self.title = "Remote PiCam Viewer"
-        self.resizable(False, False)
+        self.geometry(f"{width}x{height}")
         theme_path = Path.cwd() / "sun-valley.tcl"
         self.has_theme = theme_path.exists()
         if self.has_theme:
@@ -69,9 +287,75 @@ class RemotePiCamGUI(MainWindow):
         self.make_key_binds()
         self.dark_mode_var.set(self.settings["gui"]["dark_mode"])
         self.on_close = self.close_window
-        self.update_image(self.settings["gui"]["queue"]["check"])
+        if hasattr(self.tk, "createfilehandler"):
+            self.tk.createfilehandler(self._wakeup_recv, tk.READABLE,
+                                      self.wake_up)
+        else:
+            # Tk can't watch sockets on Windows, so check the queues instead
+            logger.info("Checking for frames every "
+                        f"{self.settings['gui']['queue']['check']} ms")
+            self.update_image(self.settings["gui"]["queue"]["check"])
         self.lift()
 
+    def grid_shape(self) -> tuple[int, int]:
+        """
+        Get how many columns and rows the camera grid has.
+
+        :return: A tuple of the columns and rows.
+        """
+        columns = math.ceil(math.sqrt(len(self.tiles)))
+        rows = math.ceil(len(self.tiles) / columns)
+        return columns, rows
+
+    def tile_display_size(self, width: int,
+                          height: int) -> tuple[int, int]:
+        """
+        Get the biggest size a frame can be shown at in a tile of the grid.
+        Frames are scaled to fit in this.
+
+        :param width: The width of the whole grid.
+        :param height: The height of the whole grid.
+        :return: A tuple of the width and height.
+        """
+        columns, rows = self.grid_shape()
+        return max(width // columns - 4, 1), max(height // rows - 30, 1)
+
+    @property
+    def selected(self) -> CameraTile:
+        """
+        Get the tile of the selected camera. The menus act on this one.
+
+        :return: A CameraTile.
+        """
+        return self.tiles[self.selected_index]
+
+    @property
+    def cam(self) -> RemotePiCam:
+        """
+        Get the selected RemotePiCam.
+
+        :return: A RemotePiCam.
+        """
+        return self.selected.cam
+
+    @property
+    def curr_img(self) -> Image.Image:
+        """
+        Get the image currently shown for the selected camera.
+
+        :return: A PIL.Image, or None if nothing has been shown yet.
+        """
+        return self.selected.curr_img
+
+    @property
+    def curr_frame(self) -> PiCamFrame:
+        """
+        Get the frame currently shown for the selected camera.
+
+        :return: A Frame, or None if nothing has been shown yet.
+        """
+        return self.selected.curr_frame
+
     def load_settings(self) -> None:
         """
         Load the settings from a file.
@@ -80,22 +364,62 @@ class RemotePiCamGUI(MainWindow):
         """
         logger.info(f"Loading settings from {SETTINGS_PATH}")
         defaults = {
-            "camera": {
-                "name": "picam",
-                "port": 7896
+            "cameras": [
+                {
+                    "name": "picam",
+                    "port": 7896
+                }
+            ],
+            "profiles": {},
+            "reconnect": {
+                "enabled": True,
+                "initial_delay": 0.5,
+                "max_delay": 30
+            },
+            "clock_sync": {
+                "interval": 30,
+                "samples": 8
+            },
+            "metrics": {
+                "interval": 10,
+                "file": None,
+                "max_size": 10 * 1024 * 1024,
+                "backups": 3,
+                "prometheus_port": None
             },
             "gui": {
                 "dark_mode": False,
                 "queue": {
                     "check": 50,
                     "size": 32
+                },
+                "buffer": {
+                    "policy": LATEST_ONLY,
+                    "playout_delay": 100,
+                    "budget": 16 * 1024 * 1024
+                },
+                "decode": {
+                    "workers": 1
+                },
+                "pan_tilt": {
+                    "rate": 20,
+                    "step": 2
+                },
+                "viewport": {
+                    "width": 1280,
+                    "height": 720,
+                    "resample": "bilinear"
                 }
             }
         }
         if not SETTINGS_PATH.exists():
             logger.warning("Settings file does not exist, creating!")
             SETTINGS_PATH.write_text(dump_json(defaults, indent=4))
-        self.settings = defaults | load_json(SETTINGS_PATH.read_text())
+        loaded = load_json(SETTINGS_PATH.read_text())
+        if "camera" in loaded and "cameras" not in loaded:
+            logger.info("Moving single camera setting to camera list")
+            loaded["cameras"] = [loaded.pop("camera")]
+        self.settings = merge_settings(defaults, loaded)
 
     def save_settings(self) -> None:
         """
@@ -114,12 +438,55 @@ class RemotePiCamGUI(MainWindow):
         """
         logger.debug("Creating GUI elements")
 
-        self.image_label = Label(self)
-        self.image_label.display_mode = DisplayModes.ImageOnly
-        self.image_label.image = ImageTk.PhotoImage(
-            Image.new("RGBA", (300, 50))
-        )
-        self.image_label.grid(row=0, column=0, padx=1, pady=1, sticky=tk.NW)
+        self.grid_frame = Frame(self)
+        self.grid_frame.grid(row=0, column=0, padx=1, pady=1, sticky=tk.NSEW)
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+        self.grid_frame.bind("<Configure>", self.viewport_resized)
+        columns, rows = self.grid_shape()
+        for column in range(columns):
+            self.grid_frame.columnconfigure(column, weight=1, uniform="tile")
+        for row in range(rows):
+            self.grid_frame.rowconfigure(row, weight=1, uniform="tile")
+        for i, tile in enumerate(self.tiles):
+            tile_frame = Frame(self.grid_frame)
+            tile_frame.grid(row=i // columns, column=i % columns, padx=1,
+                            pady=1, sticky=tk.NW)
+            tile.image_label = Label(tile_frame)
+            tile.image_label.display_mode = DisplayModes.ImageOnly
+            tile.show_image(Image.new("RGBA", (300, 50)))
+            tile.image_label.grid(row=0, column=0, sticky=tk.NW)
+            tile.caption_label = Label(tile_frame, text=tile.cam.name)
+            tile.caption_label.grid(row=1, column=0, sticky=tk.NW)
+            for widget in (tile.image_label, tile.caption_label):
+                widget.bind("<Button-1>",
+                            lambda *args, index=i:
+                            self.selected_camera_var.set(index))
+            tile.image_label.bind("<ButtonPress-1>",
+                                  lambda event, t=tile:
+                                  self.start_drag(t, event), add=True)
+            tile.image_label.bind("<B1-Motion>",
+                                  lambda event, t=tile:
+                                  self.drag_servos(t, event))
+            # Button 2 is the right button on macOS and the middle one
+            # everywhere else, so both pan
+            for button in (2, 3):
+                tile.image_label.bind(f"<ButtonPress-{button}>",
+                                      lambda event, t=tile:
+                                      self.start_pan(t, event))
+                tile.image_label.bind(f"<B{button}-Motion>",
+                                      lambda event, t=tile:
+                                      self.pan_view(t, event))
+            tile.image_label.bind("<MouseWheel>",
+                                  lambda event, t=tile:
+                                  self.zoom_view(t, 1.25 if event.delta > 0
+                                                 else 0.8, event))
+            tile.image_label.bind("<Button-4>",
+                                  lambda event, t=tile:
+                                  self.zoom_view(t, 1.25, event))
+            tile.image_label.bind("<Button-5>",
+                                  lambda event, t=tile:
+                                  self.zoom_view(t, 0.8, event))
 
         self.status_label = Label(self, text="Nothing to do yet")
         self.status_label.grid(row=1, column=0, padx=1, pady=1, sticky=tk.SW)
@@ -141,9 +508,50 @@ class RemotePiCamGUI(MainWindow):
         self.iso_var.trace_add("write", self.update_iso_status)
         self.dark_mode_var = tk.BooleanVar(self, value=False)
         self.dark_mode_var.trace_add("write", self.toggle_theme)
+        self.buffer_policy_var = tk.StringVar(
+            self, value=self.settings["gui"]["buffer"]["policy"]
+        )
+        self.buffer_policy_var.trace_add("write", self.update_buffer_policy)
+        self.resample_var = tk.StringVar(
+            self, value=self.settings["gui"]["viewport"]["resample"]
+        )
+        self.resample_var.trace_add("write", self.update_resample)
+        self.selected_camera_var = tk.IntVar(self, value=self.selected_index)
+        self.selected_camera_var.trace_add("write", self.select_camera)
         self.menu_bar = Menu(self, is_menubar=True, command=self.remake_menu)
         self.remake_menu()
 
+    def select_camera(self, *args) -> None:
+        """
+        Select the camera the menus act on.
+
+        :return: None.
+        """
+        self.selected_index = self.selected_camera_var.get()
+        logger.debug(f"Selected camera {repr(self.cam.name)}")
+        self.stream_paused_var.set(self.selected.paused)
+        self.update_captions()
+        self.status_label.text = f"Selected camera \"{self.cam.name}\"."
+
+    def update_captions(self) -> None:
+        """
+        Update the caption under every camera tile.
+
+        :return: None.
+        """
+        for i, tile in enumerate(self.tiles):
+            if tile.cam.is_connected:
+                state = "connected"
+            elif tile.supervisor.reconnecting:
+                state = "reconnecting"
+            else:
+                state = "disconnected"
+            text = f"{tile.cam.name} ({state})"
+            if i == self.selected_index and len(self.tiles) > 1:
+                text = f"> {text}"
+            if tile.caption_label.text != text:
+                tile.caption_label.text = text
+
     def toggle_theme(self, *args) -> None:
         """
         Toggle the theme between light and dark mode.
@@ -195,18 +603,36 @@ class RemotePiCamGUI(MainWindow):
                 variable=self.iso_var,
                 enabled=self.cam.is_connected
             ))
+        available_profiles = []
+        for name in self.settings["profiles"]:
+            available_profiles.append(MenuCommand(
+                label=name,
+                enabled=self.cam.is_connected,
+                command=lambda name=name: self.apply_profile(name)
+            ))
+        if len(available_profiles) == 0:
+            available_profiles.append(MenuCommand(
+                label="No profiles in settings file", enabled=False
+            ))
+        available_cameras = []
+        for i, tile in enumerate(self.tiles):
+            available_cameras.append(MenuRadiobutton(
+                value=i,
+                label=tile.cam.name,
+                variable=self.selected_camera_var
+            ))
         self.menu_bar.items = [
             MenuCascade(label="File", items=[
                 MenuCommand(label="Connect", underline=0,
                             accelerator="Command-C" if on_aqua(self)
                             else "Control+C",
-                            enabled=not self.cam.is_connected and
-                                    not self.connecting,
+                            enabled=self.can_connect(),
                             command=self.start_connecting_window),
                 MenuCommand(label="Disconnect", underline=0,
                             accelerator="Command-D" if on_aqua(self)
                             else "Control+D",
-                            enabled=self.cam.is_connected,
+                            enabled=self.cam.is_connected or
+                                    self.selected.supervisor.reconnecting,
                             command=self.spawn_disconnect_thread),
                 MenuSeparator(),
                 MenuCommand(label="Exit", underline=0,
@@ -244,6 +670,17 @@ class RemotePiCamGUI(MainWindow):
                 MenuCommand(label="Set saturation", underline=4,
                             enabled=self.cam.is_connected,
                             command=self.set_saturation),
+                MenuSeparator(),
+                MenuCascade(label="Apply profile", underline=6,
+                            items=available_profiles),
+                MenuCascade(label="Buffering", underline=0, items=[
+                    MenuRadiobutton(value=LATEST_ONLY,
+                                    label="Latest frame only",
+                                    variable=self.buffer_policy_var),
+                    MenuRadiobutton(value=JITTER_BUFFER,
+                                    label="Jitter buffer",
+                                    variable=self.buffer_policy_var)
+                ]),
             ]),
             MenuCascade(label="Control", items=[
                 MenuCommand(label="Open pan-tilt control panel", underline=14,
@@ -254,6 +691,29 @@ class RemotePiCamGUI(MainWindow):
                             command=self.open_pan_tilt_control_panel)
             ]),
             MenuCascade(label="View", items=[
+                MenuCascade(label="Select camera", underline=0,
+                            items=available_cameras),
+                MenuSeparator(),
+                MenuCommand(label="Zoom in", underline=5,
+                            accelerator="+",
+                            enabled=self.curr_img is not None,
+                            command=lambda: self.zoom_view(self.selected,
+                                                           1.25)),
+                MenuCommand(label="Zoom out", underline=5,
+                            accelerator="-",
+                            enabled=self.selected.zoom > 1,
+                            command=lambda: self.zoom_view(self.selected,
+                                                           0.8)),
+                MenuCommand(label="Reset zoom", underline=0,
+                            accelerator="0",
+                            enabled=self.selected.zoom > 1,
+                            command=lambda: self.zoom_view(self.selected, 0)),
+                MenuCascade(label="Scaling", underline=1, items=[
+                    MenuRadiobutton(value=name, label=name.title(),
+                                    variable=self.resample_var)
+                    for name in RESAMPLE_FILTERS
+                ]),
+                MenuSeparator(),
                 MenuCheckbutton(label="Dark mode",
                                 variable=self.dark_mode_var,
                                 enabled=self.has_theme),
@@ -273,6 +733,15 @@ class RemotePiCamGUI(MainWindow):
             ])
         ]
 
+    def can_connect(self) -> bool:
+        """
+        Get whether we can start connecting to the selected camera.
+
+        :return: A bool.
+        """
+        return not self.cam.is_connected and not self.connecting and \
+            not self.selected.supervisor.reconnecting
+
     def make_menu_link(self, label: str, link: str) -> MenuCascade:
         """
         Make a MenuCascade that can open a link in the browser or copy it to
@@ -412,11 +881,11 @@ class RemotePiCamGUI(MainWindow):
         """
         logger.debug("Making key binds...")
         self.make_key_bind("<Command-c>" if on_aqua(self) else "<Control-c>",
-                           lambda: not self.cam.is_connected and
-                                   not self.connecting,
+                           self.can_connect,
                            self.start_connecting_window)
         self.make_key_bind("<Command-d>" if on_aqua(self) else "<Control-d>",
-                           lambda: self.cam.is_connected,
+                           lambda: self.cam.is_connected or
+                                   self.selected.supervisor.reconnecting,
                            self.spawn_disconnect_thread)
         self.make_key_bind("<Escape>", lambda: True, self.close_from_escape)
         self.make_key_bind("<Command-p>" if on_aqua(self) else "<Control-p>",
@@ -431,6 +900,25 @@ class RemotePiCamGUI(MainWindow):
                            lambda: self.cam.is_connected and
                                    self.cam.settings["servos"]["enable"],
                            self.open_pan_tilt_control_panel)
+        self.make_key_bind("<plus>", lambda: self.curr_img is not None,
+                           lambda: self.zoom_view(self.selected, 1.25))
+        self.make_key_bind("<equal>", lambda: self.curr_img is not None,
+                           lambda: self.zoom_view(self.selected, 1.25))
+        self.make_key_bind("<minus>", lambda: self.selected.zoom > 1,
+                           lambda: self.zoom_view(self.selected, 0.8))
+        self.make_key_bind("<Key-0>", lambda: self.selected.zoom > 1,
+                           lambda: self.zoom_view(self.selected, 0))
+        for key, x, y in (("<Shift-Left>", -0.1, 0), ("<Shift-Right>", 0.1, 0),
+                          ("<Shift-Up>", 0, -0.1), ("<Shift-Down>", 0, 0.1)):
+            self.make_key_bind(key, lambda: self.selected.zoom > 1,
+                               lambda x=x, y=y: self.move_view(self.selected,
+                                                               x, y))
+        step = self.settings["gui"]["pan_tilt"]["step"]
+        for key, pan, tilt in (("<Left>", -step, 0), ("<Right>", step, 0),
+                               ("<Up>", 0, step), ("<Down>", 0, -step)):
+            self.make_key_bind(key, self.can_move_servos,
+                               lambda pan=pan, tilt=tilt:
+                               self.nudge_servos(pan, tilt))
 
     def create_stat_window(self) -> Window:
         """
@@ -450,32 +938,194 @@ class RemotePiCamGUI(MainWindow):
         y_scroll = Scrollbar(window, orientation=OrientModes.Horizontal,
                              widget=self.debug_text)
         y_scroll.grid(row=1, column=0, padx=(0, 1), pady=1)
+        self.sparkline_canvas = tk.Canvas(
+            window, width=360,
+            height=len(SPARKLINES) * SPARKLINE_HEIGHT + 14,
+            highlightthickness=0
+        )
+        self.sparkline_canvas.grid(row=2, column=0, columnspan=2, padx=1,
+                                   pady=1, sticky=tk.EW)
         window.rowconfigure(0, weight=1)
         window.columnconfigure(0, weight=1)
-        self.update_stats()
+        self._stats_timer = None
+        # Only spend time on the stats while they can be seen
+        window.bind("<Map>", lambda event: self.start_stats()
+                    if event.widget is window else None)
         return window
 
+    def start_stats(self) -> None:
+        """
+        Start updating the stats, if they aren't being updated already.
+
+        :return: None.
+        """
+        if self._stats_timer is None:
+            self.update_stats()
+
     def update_stats(self) -> None:
         """
-        Start updating the stats. Will automatically reschedule by itself.
+        Update the stats. Will automatically reschedule by itself until the
+        stats window is hidden.
 
         :return: None.
         """
-        text = f"Connected: {self.cam.is_connected}\n"
-        text += f"Image queue size: {self.image_queue.qsize()} / " \
-                f"{self.settings['gui']['queue']['size']}\n"
+        if not self.stat_window.winfo_viewable():
+            self._stats_timer = None
+            return
+        text = ""
+        for tile in self.tiles:
+            text += f"[{tile.cam.name}]\n"
+            text += self.tile_stats(tile)
+            text += "\n"
+        self.debug_text.text = text.strip()
+        self.draw_sparklines(self.selected)
+        self._stats_timer = self.after(50, self.update_stats)
+
+    def draw_sparklines(self, tile: CameraTile) -> None:
+        """
+        Draw the graphs of the latencies and throughput of a camera in the
+        stats window.
+
+        :param tile: The CameraTile.
+        :return: None.
+        """
+        canvas = self.sparkline_canvas
+        canvas.delete("all")
+        dark = self.dark_mode_var.get()
+        text_color = "#fafafa" if dark else "#1c1c1c"
+        canvas.configure(bg="#1c1c1c" if dark else "#fafafa")
+        left = 150
+        right = max(canvas.winfo_width() - 4, left + 10)
+        canvas.create_text(4, 2, anchor=tk.NW, fill=text_color,
+                           text=f"{tile.cam.name}:")
+        for row, (name, label, unit, scale) in enumerate(SPARKLINES):
+            top = row * SPARKLINE_HEIGHT + 14
+            values = [value * scale for value in tile.metrics.series(name)]
+            latest = f"{round(values[-1], 1)} {unit}" if values else "-"
+            canvas.create_text(4, top + SPARKLINE_HEIGHT // 2 - 7,
+                               anchor=tk.W, fill=text_color,
+                               text=f"{label}: {latest}")
+            if len(values) < 2:
+                continue
+            peak = max(values) or 1
+            step = (right - left) / (len(values) - 1)
+            height = SPARKLINE_HEIGHT - 8
+            points = []
+            for i, value in enumerate(values):
+                points.append(left + i * step)
+                points.append(top + height - value / peak * height)
+            canvas.create_line(*points, fill="#3584e4")
+
+    def tile_stats(self, tile: CameraTile) -> str:
+        """
+        Make the stats text for one camera.
+
+        :param tile: The CameraTile.
+        :return: A str.
+        """
+        text = f"Connected: {tile.cam.is_connected}\n"
+        text += f"Protocol version: {tile.cam.protocol}\n"
+        if tile.paused:
+            text += "Paused: PiCam stopped sending\n" \
+                if tile.paused_upstream else "Paused: draining frames\n"
+        text += f"Frames drained while paused: {tile.cam.frames_drained}\n"
+        buffer = tile.frame_buffer
+        text += f"Frame buffer: {buffer.qsize()} / {buffer.maxsize} frames, " \
+                f"{round(buffer.bytes / 1024, 2)} / " \
+                f"{round(buffer.budget / 1024)} kb\n"
+        text += f"Image queue size: {tile.image_queue.qsize()} / " \
+                f"{tile.image_queue.maxsize}\n"
         text += f"Current image size: " \
-                f"{round(self.curr_img_size / 1024, 2)} kb\n"
-        text += f"Stream latency: " \
-                f"{round(abs((unix() * 1000) - self.curr_img_time))} ms\n"
-        if unix() - self.last_frame_reset > 1:
-            self.last_frame_reset = unix()
-            self.stream_fps = self.frames_this_sec
-            self.frames_this_sec = 0
-        text += f"Stream FPS: {self.stream_fps}\n"
-        text += f"Frames received: {self.frames_got}"
-        self.debug_text.text = text
-        self.after(50, self.update_stats)
+                f"{round(tile.curr_img_size / 1024, 2)} kb\n"
+        clock = tile.clock
+        latency = tile.metrics.stream_latency
+        if latency is None:
+            text += "Stream latency: unknown\n"
+        elif clock.synced:
+            text += f"Stream latency: {round(latency)} ms " \
+                    f"± {round(clock.error, 1)} ms\n"
+        else:
+            text += f"Stream latency: {round(latency)} ms " \
+                    f"(clocks not synced)\n"
+        if clock.synced:
+            text += f"PiCam clock offset: {round(clock.offset())} ms, " \
+                    f"drifting {round(clock.drift, 1)} ppm\n"
+        fps, mbps = tile.metrics.throughput()
+        text += f"Throughput: {round(fps, 1)} FPS, {round(mbps, 2)} " \
+                f"Mbit/s\n"
+        text += f"Shown FPS: {round(tile.metrics.shown_per_sec(), 1)}\n"
+        for name in INTERVALS:
+            percentiles = tile.metrics.percentiles(name)
+            if percentiles[50] is None:
+                continue
+            text += f"{name.title()} time p50/p95/p99: " + " / ".join(
+                f"{round(percentiles[p] * 1000, 1)}" for p in PERCENTILES
+            ) + " ms\n"
+        text += f"Frames received: {tile.frames_got}\n"
+        if tile.cam in self.hub.stats:
+            hub_stats = self.hub.stats[tile.cam]
+            text += f"Frames read: {hub_stats.frames} " \
+                    f"({round(hub_stats.bytes / 1024 / 1024, 2)} mb)\n"
+        if tile.cam.protocol >= 2:
+            text += f"Frames dropped by PiCam: {tile.cam.upstream_drops}\n"
+            if tile.curr_frame is not None:
+                text += f"Frame resolution: {tile.curr_frame.width}x" \
+                        f"{tile.curr_frame.height}\n"
+        else:
+            text += "Frames dropped by PiCam: unknown\n"
+        text += f"Frames dropped by viewer: " \
+                f"{tile.pipeline.dropped_frames}\n"
+        text += f"Late frames dropped: {tile.pipeline.late_frames}\n"
+        text += f"Frames skipped to show the newest: {tile.frames_skipped}\n"
+        text += f"Buffer policy: {buffer.policy}\n"
+        for policy in buffer.dropped:
+            text += f"Buffer drops / late ({policy}): " \
+                    f"{buffer.dropped[policy]} / {buffer.late[policy]}\n"
+        for name, fps in tile.pipeline.worker_fps().items():
+            text += f"{name} FPS: {fps}\n"
+        text += f"Photo images made: {tile.photos_made}\n"
+        text += f"Buffer pool hits / misses: {tile.cam.buffer_pool.hits} / " \
+                f"{tile.cam.buffer_pool.misses}\n"
+        worker = tile.settings_worker
+        if worker.last_round_trip is not None:
+            times = worker.round_trip_times
+            text += f"Settings round trip: " \
+                    f"{round(worker.last_round_trip * 1000)} ms (avg " \
+                    f"{round(sum(times) / len(times) * 1000)} ms, max " \
+                    f"{round(max(times) * 1000)} ms)\n"
+        text += f"Settings calls / merged: {worker.calls} / " \
+                f"{worker.coalesced}\n"
+        servos = tile.servos
+        text += f"Pan/tilt commands sent / skipped: {servos.sent} / " \
+                f"{servos.skipped}\n"
+        if servos.last_latency is not None:
+            latencies = servos.latencies
+            text += f"Pan/tilt command to ack: " \
+                    f"{round(servos.last_latency * 1000)} ms (avg " \
+                    f"{round(sum(latencies) / len(latencies) * 1000)} ms)\n"
+        text += f"Reconnecting: {tile.supervisor.reconnecting}\n"
+        text += f"Outages: {tile.supervisor.outages}\n"
+        if tile.supervisor.last_recovery_time is not None:
+            text += f"Last time to recover: " \
+                    f"{round(tile.supervisor.last_recovery_time, 2)} s\n"
+        return text
+
+    def collect_metrics(self) -> dict[str, dict]:
+        """
+        Collect the metrics of every camera, for the metrics exporter. This
+        is called on the exporter thread, so it must not touch Tk.
+
+        :return: A dict of camera names to their metrics.
+        """
+        snapshot = {}
+        for tile in self.tiles:
+            values = collect_camera_metrics(
+                tile.cam, tile.metrics, tile.frame_buffer, tile.pipeline,
+                tile.supervisor, tile.settings_worker, tile.clock
+            )
+            values["frames_received"] = tile.frames_got
+            snapshot[tile.cam.name] = values
+        return snapshot
 
     def toggle_stat_window_view(self, show: bool) -> None:
         """
@@ -487,6 +1137,7 @@ class RemotePiCamGUI(MainWindow):
         if show:
             self.stat_window.deiconify()
             self.stat_window.lift()
+            self.start_stats()
         else:
             self.stat_window.withdraw()
 
@@ -568,27 +1219,177 @@ class RemotePiCamGUI(MainWindow):
         self.pan_tilt_window.grab_focus()
         self.pan_tilt_window.wait_till_destroyed()
 
+    def viewport_resized(self, event: tk.Event) -> None:
+        """
+        Called by Tk when the camera grid changes size, to scale frames to
+        fit the new size.
+
+        :param event: The Tk event.
+        :return: None.
+        """
+        size = self.tile_display_size(event.width, event.height)
+        for tile in self.tiles:
+            tile.pipeline.target_size = size
+        self.moving()
+
+    def moving(self) -> None:
+        """
+        Scale frames with the fastest filter while the view is changing, and
+        go back to the chosen filter once it stops changing for a bit.
+
+        :return: None.
+        """
+        if self._moving_timer is not None:
+            self.after_cancel(self._moving_timer)
+        for tile in self.tiles:
+            tile.pipeline.resample = Image.NEAREST
+        self._moving_timer = self.after(300, self.stopped_moving)
+
+    def stopped_moving(self) -> None:
+        """
+        Go back to the chosen filter once the view stops changing.
+
+        :return: None.
+        """
+        self._moving_timer = None
+        resample = RESAMPLE_FILTERS[self.resample_var.get()]
+        for tile in self.tiles:
+            tile.pipeline.resample = resample
+
+    def zoom_view(self, tile: CameraTile, factor: float,
+                  event: tk.Event = None) -> None:
+        """
+        Digitally zoom a camera in or out.
+
+        :param tile: The CameraTile to zoom.
+        :param factor: How much to multiply the zoom by, or 0 to reset it.
+        :param event: The Tk event of the mouse, to keep the point under the
+         mouse in place. Zooms around the center if not given.
+        :return: None.
+        """
+        if tile.photo is None or tile.curr_img is None:
+            return
+        zoom = tile.zoom * factor if factor > 0 else 1
+        if event is None:
+            tile.set_zoom(zoom, tile.center)
+        else:
+            # Keep the point under the mouse under the mouse
+            point_x, point_y = tile.frame_point(event.x, event.y)
+            fraction_x = event.x / max(tile.photo.width(), 1)
+            fraction_y = event.y / max(tile.photo.height(), 1)
+            zoom = min(max(zoom, 1), MAX_ZOOM)
+            tile.set_zoom(zoom, (point_x + (0.5 - fraction_x) / zoom,
+                                 point_y + (0.5 - fraction_y) / zoom))
+        self.status_label.text = f"Zoom {round(tile.zoom * 100)}%"
+        self.moving()
+
+    def move_view(self, tile: CameraTile, x: float, y: float) -> None:
+        """
+        Pan the view of a zoomed in camera.
+
+        :param tile: The CameraTile.
+        :param x: How far to move right, as a fraction of the view.
+        :param y: How far to move down, as a fraction of the view.
+        :return: None.
+        """
+        tile.set_zoom(tile.zoom, (tile.center[0] + x / tile.zoom,
+                                  tile.center[1] + y / tile.zoom))
+        self.moving()
+
+    def start_pan(self, tile: CameraTile, event: tk.Event) -> None:
+        """
+        Remember where the mouse was pressed on a camera, to pan its view
+        when the mouse is dragged.
+
+        :param tile: The CameraTile that was pressed.
+        :param event: The Tk event.
+        :return: None.
+        """
+        tile.pan_start = event.x, event.y
+
+    def pan_view(self, tile: CameraTile, event: tk.Event) -> None:
+        """
+        Pan the view of a camera as the mouse is dragged on it, so the frame
+        follows the mouse.
+
+        :param tile: The CameraTile being dragged on.
+        :param event: The Tk event.
+        :return: None.
+        """
+        if tile.pan_start is None or tile.photo is None or tile.zoom == 1:
+            return
+        last_x, last_y = tile.pan_start
+        tile.pan_start = event.x, event.y
+        self.move_view(tile, (last_x - event.x) / max(tile.photo.width(), 1),
+                       (last_y - event.y) / max(tile.photo.height(), 1))
+
+    def can_move_servos(self) -> bool:
+        """
+        Get whether the selected camera is connected and has pan/tilt servos.
+
+        :return: A bool.
+        """
+        return self.cam.is_connected and self.cam.settings["servos"]["enable"]
+
+    def nudge_servos(self, pan: float, tilt: float) -> None:
+        """
+        Move the servos of the selected camera by some amount without
+        waiting for them.
+
+        :param pan: How many degrees to pan by.
+        :param tilt: How many degrees to tilt by.
+        :return: None.
+        """
+        servos = self.selected.servos
+        servos.nudge(pan, tilt)
+        new_pan, new_tilt = servos.position
+        self.status_label.text = f"Pan {round(new_pan)}°, tilt " \
+                                 f"{round(new_tilt)}°"
+
+    def start_drag(self, tile: CameraTile, event: tk.Event) -> None:
+        """
+        Remember where the mouse was pressed on a camera, to move its servos
+        when the mouse is dragged.
+
+        :param tile: The CameraTile that was pressed.
+        :param event: The Tk event.
+        :return: None.
+        """
+        tile.drag_start = event.x, event.y
+
+    def drag_servos(self, tile: CameraTile, event: tk.Event) -> None:
+        """
+        Move the servos of a camera as the mouse is dragged on it. Dragging
+        across the whole image moves across the whole range of the servos.
+
+        :param tile: The CameraTile being dragged on.
+        :param event: The Tk event.
+        :return: None.
+        """
+        if tile.drag_start is None or tile is not self.selected or \
+                not self.can_move_servos():
+            return
+        last_x, last_y = tile.drag_start
+        tile.drag_start = event.x, event.y
+        servos = tile.cam.settings["servos"]
+        width = max(event.widget.winfo_width(), 1)
+        height = max(event.widget.winfo_height(), 1)
+        pan_range = servos["pan"]["max"] - servos["pan"]["min"]
+        tilt_range = servos["tilt"]["max"] - servos["tilt"]["min"]
+        self.nudge_servos((event.x - last_x) / width * pan_range,
+                          (last_y - event.y) / height * tilt_range)
+
     def apply_pan_tilt(self) -> None:
         """
         Apply the pan/tilting.
 
         :return: None.
         """
-        try:
-            pan = int(self.new_pan_scale.value)
-            tilt = int(self.new_tilt_scale.value)
-            self.cam.settings["servos"]["pan"]["value"] = pan
-            self.cam.settings["servos"]["tilt"]["value"] = tilt
-            if not self.cam.update_settings():
-                raise RuntimeError("Failed to update settings!")
-        except Exception as e:
-            Dialog.show_error(self, title="Remote PiCam: ERROR!",
-                              message="There was an error updating the "
-                                      "camera pan/tilt!",
-                              detail=f"Exception: {e}")
-        else:
-            Dialog.show_info(self, title="Remote PiCam: Success!",
-                             message="Successfully set camera pan/tilt!")
+        pan = int(self.new_pan_scale.value)
+        tilt = int(self.new_tilt_scale.value)
+        self.send_settings({"servos": {"pan": {"value": pan},
+                                       "tilt": {"value": tilt}}},
+                           "camera pan/tilt", f"{pan}°, {tilt}°")
 
     def set_saturation(self) -> None:
         """
@@ -648,21 +1449,9 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
-        try:
-            saturation = int(self.new_saturation_scale.value)
-            self.cam.settings["saturation"]["value"] = saturation
-            if not self.cam.update_settings():
-                raise RuntimeError("Failed to update settings!")
-        except Exception as e:
-            Dialog.show_error(self, title="Remote PiCam: ERROR!",
-                              message="There was an error updating the "
-                                      "stream saturation!",
-                              detail=f"Exception: {e}")
-        else:
-            Dialog.show_info(self, title="Remote PiCam: Success!",
-                             message="Successfully set stream saturation!",
-                             detail=f"New saturation: "
-                                    f"{saturation}%")
+        saturation = int(self.new_saturation_scale.value)
+        self.send_settings({"saturation": {"value": saturation}},
+                           "stream saturation", f"{saturation}%")
 
     def set_contrast(self) -> None:
         """
@@ -721,21 +1510,9 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
-        try:
-            contrast = int(self.new_contrast_scale.value)
-            self.cam.settings["contrast"]["value"] = contrast
-            if not self.cam.update_settings():
-                raise RuntimeError("Failed to update settings!")
-        except Exception as e:
-            Dialog.show_error(self, title="Remote PiCam: ERROR!",
-                              message="There was an error updating the "
-                                      "stream contrast!",
-                              detail=f"Exception: {e}")
-        else:
-            Dialog.show_info(self, title="Remote PiCam: Success!",
-                             message="Successfully set stream contrast!",
-                             detail=f"New contrast: "
-                                    f"{contrast}%")
+        contrast = int(self.new_contrast_scale.value)
+        self.send_settings({"contrast": {"value": contrast}},
+                           "stream contrast", f"{contrast}%")
 
     def set_brightness(self) -> None:
         """
@@ -794,21 +1571,9 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
-        try:
-            brightness = int(self.new_bright_scale.value)
-            self.cam.settings["brightness"]["value"] = brightness
-            if not self.cam.update_settings():
-                raise RuntimeError("Failed to update settings!")
-        except Exception as e:
-            Dialog.show_error(self, title="Remote PiCam: ERROR!",
-                              message="There was an error updating the "
-                                      "stream brightness!",
-                              detail=f"Exception: {e}")
-        else:
-            Dialog.show_info(self, title="Remote PiCam: Success!",
-                             message="Successfully set stream brightness!",
-                             detail=f"New brightness: "
-                                    f"{brightness}%")
+        brightness = int(self.new_bright_scale.value)
+        self.send_settings({"brightness": {"value": brightness}},
+                           "stream brightness", f"{brightness}%")
 
     def set_resolution(self) -> None:
         """
@@ -855,22 +1620,76 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
-        try:
-            resolution = tuple([int(p) for p in
-                                self.new_res_combobox.value.split("x")])
-            self.cam.settings["resolution"]["selected"] = resolution
-            if not self.cam.update_settings():
-                raise RuntimeError("Failed to update settings!")
-        except Exception as e:
+        resolution = tuple([int(p) for p in
+                            self.new_res_combobox.value.split("x")])
+        self.send_settings({"resolution": {"selected": resolution}},
+                           "stream resolution", self.new_res_combobox.value)
+
+    def apply_profile(self, name: str) -> None:
+        """
+        Apply a profile from the settings file to the selected camera in one
+        update.
+
+        :param name: The name of the profile.
+        :return: None.
+        """
+        profile = self.settings["profiles"][name]
+        unknown = [key for key in profile if key not in self.cam.settings]
+        if len(unknown) > 0:
             Dialog.show_error(self, title="Remote PiCam: ERROR!",
-                              message="There was an error updating the "
-                                      "stream resolution!",
-                              detail=f"Exception: {e}")
-        else:
+                              message=f"Profile \"{name}\" has unknown "
+                                      f"settings!",
+                              detail=f"Unknown settings: {', '.join(unknown)}")
+            return
+        logger.debug(f"Applying profile {repr(name)}: {profile}")
+        self.send_settings(profile, "profile", name)
+
+    def send_settings(self, changes: dict, what: str, value: str) -> None:
+        """
+        Send settings changes to the selected camera in the background, and
+        tell the user how it went once the camera replies.
+
+        :param changes: A nested dict of the settings to change.
+        :param what: What is being changed, like "stream brightness".
+        :param value: The new value to show the user.
+        :return: None.
+        """
+        tile = self.selected
+        self.status_label.text = f"Setting {what} to \"{value}\"..."
+
+        def on_done(ok: bool, error: Exception = None):
+            self.after(0, lambda: self.settings_sent(tile, what, value, ok,
+                                                     error))
+
+        tile.settings_worker.submit(changes, on_done)
+
+    def settings_sent(self, tile: CameraTile, what: str, value: str,
+                      ok: bool, error: Exception = None) -> None:
+        """
+        Called on the Tk thread once a camera replied to a settings change.
+
+        :param tile: The CameraTile of the camera.
+        :param what: What was being changed, like "stream brightness".
+        :param value: The new value.
+        :param ok: Whether the camera accepted the change.
+        :param error: The exception if sending failed.
+        :return: None.
+        """
+        if ok:
+            self.status_label.text = f"{what[0].upper() + what[1:]} of " \
+                                     f"\"{tile.cam.name}\" set to " \
+                                     f"\"{value}\"!"
             Dialog.show_info(self, title="Remote PiCam: Success!",
-                             message="Successfully set stream resolution!",
-                             detail=f"New resolution: "
-                                    f"{self.new_res_combobox.value}")
+                             message=f"Successfully set {what}!",
+                             detail=f"New value: {value}")
+        else:
+            self.status_label.text = f"Failed to set {what} of " \
+                                     f"\"{tile.cam.name}\" to \"{value}\"!"
+            Dialog.show_error(self, title="Remote PiCam: ERROR!",
+                              message=f"There was an error updating the "
+                                      f"{what}!",
+                              detail=f"Exception: {error}" if error
+                              else "The PiCam did not accept the settings.")
 
     def update_paused_status(self, *args) -> None:
         """
@@ -878,35 +1697,92 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
-        if self.stream_paused_var.get():
-            self.status_label.text = "Paused."
+        tile = self.selected
+        paused = self.stream_paused_var.get()
+        if tile.paused == paused:
+            return
+        tile.paused = paused
+        if paused:
+            self.status_label.text = "Pausing..."
+            # Don't show buffered frames from before the pause on resume
+            tile.frame_buffer.clear()
         else:
-            self.status_label.text = "Resume."
+            self.status_label.text = "Resuming..."
+        self.spawn_pause_thread(tile)
 
-    def update_iso_status(self, *args) -> None:
+    def spawn_pause_thread(self, tile: CameraTile) -> None:
         """
-        Update the status bar when we set the ISO of the stream.
+        Spawn the thread that tells a camera to pause or resume.
 
+        :param tile: The CameraTile of the camera.
         :return: None.
         """
+        logger.debug("Spawning pause thread")
+        t = Thread(target=self.pause_camera, args=(tile, ), daemon=True)
+        t.start()
+
+    def pause_camera(self, tile: CameraTile) -> None:
+        """
+        Pause or resume a camera to match its tile. The camera is asked to
+        stop sending frames, and if it can't, frames are thrown away as soon
+        as they are read.
+
+        :param tile: The CameraTile of the camera.
+        :return: None.
+        """
+        paused = tile.paused
         try:
-            self.cam.settings["iso"]["selected"] = self.iso_var.get()
-            if not self.cam.update_settings():
-                raise RuntimeError("Failed to update settings!")
+            tile.paused_upstream = tile.cam.pause_stream(paused) and paused
         except Exception as e:
-            Dialog.show_error(self, title="Remote PiCam: ERROR!",
-                              message="There was an error updating the "
-                                      "stream ISO!",
-                              detail=f"Exception: {e}")
-            self.status_label.text = f"Failed to set ISO to " \
-                                     f"\"{self.iso_var.get()}\"!"
+            logger.warning(f"Failed to tell PiCam to pause: {e}")
+            tile.paused_upstream = False
+        if not paused:
+            self.status_label.text = "Resumed."
+        elif tile.paused_upstream:
+            self.status_label.text = "Paused."
         else:
-            Dialog.show_info(self, title="Remote PiCam: Success!",
-                             message="Successfully set ISO!",
-                             detail=f"New value: "
-                                    f"{self.iso_var.get()}")
-            self.status_label.text = f"ISO set to " \
-                                     f"\"{self.iso_var.get()}\"!"
+            self.status_label.text = "Paused, but the PiCam is still " \
+                                     "sending frames."
+
+    def update_buffer_policy(self, *args) -> None:
+        """
+        Switch the frame buffering policy of every camera.
+
+        :return: None.
+        """
+        policy = self.buffer_policy_var.get()
+        for tile in self.tiles:
+            tile.frame_buffer.policy = policy
+        self.settings["gui"]["buffer"]["policy"] = policy
+        self.save_settings()
+        if policy == JITTER_BUFFER:
+            delay = self.settings["gui"]["buffer"]["playout_delay"]
+            self.status_label.text = f"Buffering frames for {delay} ms."
+        else:
+            self.status_label.text = "Showing the latest frame only."
+
+    def update_resample(self, *args) -> None:
+        """
+        Set the filter frames are scaled with.
+
+        :return: None.
+        """
+        name = self.resample_var.get()
+        self.settings["gui"]["viewport"]["resample"] = name
+        self.save_settings()
+        if self._moving_timer is None:
+            for tile in self.tiles:
+                tile.pipeline.resample = RESAMPLE_FILTERS[name]
+        self.status_label.text = f"Scaling frames with the {name} filter."
+
+    def update_iso_status(self, *args) -> None:
+        """
+        Update the status bar when we set the ISO of the stream.
+
+        :return: None.
+        """
+        iso = self.iso_var.get()
+        self.send_settings({"iso": {"selected": iso}}, "ISO", str(iso))
 
     def update_effect_status(self, *args) -> None:
         """
@@ -914,24 +1790,9 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
-        try:
-            self.cam.settings["effect"]["selected"] = self.effect_var.get()
-            if not self.cam.update_settings():
-                raise RuntimeError("Failed to update settings!")
-        except Exception as e:
-            Dialog.show_error(self, title="Remote PiCam: ERROR!",
-                              message="There was an error updating the "
-                                      "stream image effect!",
-                              detail=f"Exception: {e}")
-            self.status_label.text = f"Failed to set effect to " \
-                                     f"\"{self.effect_var.get()}\"!"
-        else:
-            Dialog.show_info(self, title="Remote PiCam: Success!",
-                             message="Successfully set image effect!",
-                             detail=f"New value: "
-                                    f"{self.effect_var.get()}")
-            self.status_label.text = f"Effect set to " \
-                                     f"\"{self.effect_var.get()}\"!"
+        effect = self.effect_var.get()
+        self.send_settings({"effect": {"selected": effect}}, "image effect",
+                           effect)
 
     def update_awb_status(self, *args) -> None:
         """
@@ -939,24 +1800,9 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
-        try:
-            self.cam.settings["awb_mode"]["selected"] = self.awb_mode_var.get()
-            if not self.cam.update_settings():
-                raise RuntimeError("Failed to update settings!")
-        except Exception as e:
-            Dialog.show_error(self, title="Remote PiCam: ERROR!",
-                              message="There was an error updating the "
-                                      "stream auto white balance!",
-                              detail=f"Exception: {e}")
-            self.status_label.text = f"Failed to set auto white balance to " \
-                                     f"\"{self.awb_mode_var.get()}\"!"
-        else:
-            Dialog.show_info(self, title="Remote PiCam: Success!",
-                             message="Successfully set auto white balance!",
-                             detail=f"New value: "
-                                    f"{self.awb_mode_var.get()}")
-            self.status_label.text = f"Auto white balance set to " \
-                                     f"\"{self.awb_mode_var.get()}\"!"
+        mode = self.awb_mode_var.get()
+        self.send_settings({"awb_mode": {"selected": mode}},
+                           "auto white balance", mode)
 
     def take_photo(self) -> None:
         """
@@ -965,7 +1811,14 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
-        self.photo_taken = self.curr_img.copy()
+        # The shown image may have been decoded at a smaller scale, so decode
+        # the full resolution image from the compressed frame
+        try:
+            self.photo_taken = self.curr_frame.open()
+            self.photo_taken.load()
+        except Exception as e:
+            logger.warning(f"Failed to decode full resolution photo: {e}")
+            self.photo_taken = self.curr_img.copy()
         self.photo_window = CustomDialog(self)
         self.photo_window.title = "Take a photo"
         self.photo_window.resizable(False, False)
@@ -1063,9 +1916,22 @@ class RemotePiCamGUI(MainWindow):
         :return: None.
         """
         logger.warning("Closing window!")
-        if self.cam.is_connected:
-            logger.info("Still connected to camera, disconnecting")
-            self.disconnect()
+        if self.exporter is not None:
+            self.exporter.stop()
+        self.settings["gui"]["viewport"]["width"] = self.winfo_width()
+        self.settings["gui"]["viewport"]["height"] = self.winfo_height()
+        self.save_settings()
+        for tile in self.tiles:
+            if tile.cam.is_connected:
+                logger.info(f"Still connected to camera "
+                            f"{repr(tile.cam.name)}, disconnecting")
+                self.disconnect(tile)
+            tile.cam.close()
+            tile.clock.stop()
+        if hasattr(self.tk, "createfilehandler"):
+            self.tk.deletefilehandler(self._wakeup_recv)
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
         self.destroy()
 
     def start_connecting_window(self) -> None:
@@ -1117,11 +1983,12 @@ class RemotePiCamGUI(MainWindow):
 
         :return: None.
         """
+        tile = self.selected
         self.connecting = True
         self.stop_try = False
         logger.debug(f"Attempting to connect to PiCam...")
         self.status_label.text = "Attempting to connect to the PiCam..."
-        while not self.cam.connect(timeout=1):
+        while not tile.cam.connect(timeout=1):
             if self.stop_try:
                 logger.warning("Stopped trying to connect.")
                 self.status_label.text = "Canceled attempted connection."
@@ -1139,7 +2006,27 @@ class RemotePiCamGUI(MainWindow):
         self.connecting_pb.value = 1
         self.cancel_btn.enabled = False
         self.after(100, self.conn_window.destroy)
-        self.start_update_cam_thread()
+        tile.wants_connection = True
+        self.remember_address(tile)
+        self.start_reading_cam(tile)
+        if tile.paused:
+            self.pause_camera(tile)
+        self.after(0, self.update_captions)
+
+    def remember_address(self, tile: CameraTile) -> None:
+        """
+        Save the address a camera was found at, so next time we can try it
+        before discovering the camera again.
+
+        :param tile: The CameraTile of the camera.
+        :return: None.
+        """
+        camera = self.settings["cameras"][self.tiles.index(tile)]
+        if camera.get("address") != tile.cam.address:
+            logger.debug(f"Remembering address {tile.cam.address} for "
+                         f"{repr(tile.cam.name)}")
+            camera["address"] = tile.cam.address
+            self.save_settings()
 
     def stop_connecting(self) -> None:
         """
@@ -1154,77 +2041,184 @@ class RemotePiCamGUI(MainWindow):
         self.cancel_btn.enabled = False
         self.stop_try = True
 
+    def frame_ready(self) -> None:
+        """
+        Called by the frame pipelines on their worker threads whenever a
+        frame is ready, to wake up the Tk loop. Wake ups are merged, so this
+        only writes to the wakeup socket if the Tk loop hasn't been woken up
+        already.
+
+        :return: None.
+        """
+        with self._wakeup_lock:
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+        try:
+            self._wakeup_send.send(b"\0")
+        except OSError:
+            pass
+
+    def wake_up(self, *args) -> None:
+        """
+        Called by Tk when the wakeup socket is readable.
+
+        :return: None.
+        """
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        # Clear the flag before looking at the queues, so a frame that comes
+        # in while we show frames wakes us up again
+        with self._wakeup_lock:
+            self._wakeup_pending = False
+        self.show_frames()
+
     def update_image(self, again_in: int) -> None:
         """
-        Pull and update the image on the window. You should only call this
+        Pull and update the image on the window every so often. This is only
+        used when Tk can't watch the wakeup socket. You should only call this
         once.
 
         :param again_in: An int on how many milliseconds to wait before we
          check the queue for another image.
         :return: None.
         """
-        try:
-            image, self.curr_img_size, self.curr_img_time = \
-                self.image_queue.get_nowait()
-            self.curr_img = image
-            self.frames_got += 1
-            self.frames_this_sec += 1
-            self.image_label.image = ImageTk.PhotoImage(image)
-        except queue.Empty:
-            pass
+        self.show_frames()
         self.after(again_in, lambda: self.update_image(again_in))
 
-    def start_update_cam_thread(self) -> None:
+    def show_frames(self) -> None:
         """
-        Start the update the camera thread.
+        Show the newest frame of every camera. Older frames still in the
+        queue are skipped.
 
         :return: None.
         """
-        logger.debug("Spawning update thread")
-        t = Thread(target=self.update_cam, daemon=True)
+        for tile in self.tiles:
+            frame = None
+            while True:
+                try:
+                    newer = tile.image_queue.get_nowait()
+                except queue.Empty:
+                    break
+                newer.times["dequeued"] = perf_counter()
+                if frame is not None:
+                    frame.release()
+                    tile.frames_skipped += 1
+                frame = newer
+            if frame is None:
+                continue
+            tile.show_image(frame.image)
+            frame.times["rendered"] = perf_counter()
+            tile.metrics.record(frame)
+            if tile.curr_frame is not None:
+                tile.curr_frame.release()
+            tile.curr_frame = frame
+            tile.curr_img = frame.image
+            tile.curr_img_size = frame.size
+            tile.curr_img_time = frame.frame_time
+            tile.frames_got += 1
+
+    def start_reading_cam(self, tile: CameraTile,
+                          reset_stats: bool = True) -> None:
+        """
+        Start reading frames from a connected camera on the camera hub.
+
+        :param tile: The CameraTile of the camera.
+        :param reset_stats: Whether to reset the stats of the camera.
+        :return: None.
+        """
+        logger.debug(f"Reading from PiCam {repr(tile.cam.name)}")
+        if reset_stats:
+            tile.frames_got = 0
+            tile.metrics.clear()
+        tile.pipeline.reset()
+        tile.frame_buffer.clear()
+        self.hub.add(tile.cam, tile.on_frame,
+                     lambda: self.spawn_connection_lost_thread(tile),
+                     reset_stats=reset_stats)
+
+    def spawn_connection_lost_thread(self, tile: CameraTile) -> None:
+        """
+        Spawn the connection lost thread. The camera hub calls this instead
+        of connection_lost() directly, because Tk calls from the hub thread
+        wait for the Tk thread, which may itself be waiting for the hub
+        thread in CameraHub.remove().
+
+        :param tile: The CameraTile of the camera.
+        :return: None.
+        """
+        logger.debug("Spawning connection lost thread")
+        t = Thread(target=self.connection_lost, args=(tile, ), daemon=True)
         t.start()
 
-    def update_cam(self) -> None:
+    def connection_lost(self, tile: CameraTile) -> None:
         """
-        Update the camera.
+        Called when the camera hub finds the connection to a camera dropped.
+        This starts reconnecting if enabled, otherwise it disconnects.
 
+        :param tile: The CameraTile of the camera.
         :return: None.
         """
-        try:
-            self.frames_got = 0
-            while self.cam.is_connected:
-                try:
-                    image, size, frame_time = self.cam.get_image()
-                except TypeError:
-                    break
-                if self.image_queue.full():
-                    self.image_queue.get()
-                if not self.stream_paused_var.get():
-                    self.image_queue.put((image, size, frame_time))
-        finally:
-            self.spawn_disconnect_thread()
+        if self.settings["reconnect"]["enabled"] and tile.wants_connection:
+            self.status_label.text = f"Lost connection to " \
+                                     f"\"{tile.cam.name}\", reconnecting..."
+            tile.supervisor.start(lambda: self.reconnected(tile))
+        else:
+            self.spawn_disconnect_thread(tile)
+        self.after(0, self.update_captions)
+
+    def reconnected(self, tile: CameraTile) -> None:
+        """
+        Called by the reconnect supervisor once a camera is back.
+
+        :param tile: The CameraTile of the camera.
+        :return: None.
+        """
+        recovery_time = round(tile.supervisor.last_recovery_time, 2)
+        self.status_label.text = f"Reconnected to \"{tile.cam.name}\" in " \
+                                 f"{recovery_time} s."
+        self.remember_address(tile)
+        self.start_reading_cam(tile, reset_stats=False)
+        if tile.paused:
+            # The PiCam forgot we paused it
+            self.pause_camera(tile)
+        self.after(0, self.update_captions)
 
-    def spawn_disconnect_thread(self) -> None:
+    def spawn_disconnect_thread(self, tile: CameraTile = None) -> None:
         """
         Spawn the disconnect thread.
 
+        :param tile: The CameraTile of the camera to disconnect. Defaults to
+         the selected camera.
         :return: None.
         """
         logger.warning("Spawning disconnect thread")
-        t = Thread(target=self.disconnect, daemon=True)
+        t = Thread(target=self.disconnect, args=(tile, ), daemon=True)
         t.start()
 
-    def disconnect(self) -> None:
+    def disconnect(self, tile: CameraTile = None) -> None:
         """
-        Disconnect from the PiCam.
+        Disconnect from a PiCam.
 
+        :param tile: The CameraTile of the camera to disconnect. Defaults to
+         the selected camera.
         :return: None.
         """
+        if tile is None:
+            tile = self.selected
         self.status_label.text = "Disconnecting..."
-        self.cam.disconnect()
+        tile.wants_connection = False
+        tile.supervisor.stop()
+        self.hub.remove(tile.cam)
+        tile.cam.disconnect()
         self.status_label.text = "Disconnected."
+        self.after(0, self.update_captions)
 
 
-logger.debug("Creating GUI")
-gui = RemotePiCamGUI()
-gui.mainloop()
+if __name__ == "__main__":
+    logger.debug("Creating GUI")
+    gui = RemotePiCamGUI()
+    gui.mainloop()
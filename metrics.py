@@ -0,0 +1,242 @@
+"""
+A module that keeps per-stage latencies and throughput of the frames from a
+PiCam, so you can tell which stage is the bottleneck.
+"""
+
+import math
+from threading import Lock
+from time import perf_counter, time as unix
+from typing import Optional
+
+from picam import Frame
+
+# The stages every frame is timestamped at, in order
+STAGES = ("header", "received", "decoding", "decoded", "dequeued", "rendered")
+# The latencies kept, as the stages they are between
+INTERVALS = {
+    "receive": ("header", "received"),
+    "buffer": ("received", "decoding"),
+    "decode": ("decoding", "decoded"),
+    "queue": ("decoded", "dequeued"),
+    "render": ("dequeued", "rendered"),
+    "total": ("header", "rendered")
+}
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: list[float], percent: float) -> Optional[float]:
+    """
+    Get a percentile of some values with the nearest rank method.
+
+    :param values: A list of floats.
+    :param percent: The percentile, from 0 to 100.
+    :return: A float, or None if there are no values.
+    """
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class RingBuffer:
+    """
+    Keeps the last size values in a fixed size list, so recording a value
+    never allocates.
+    """
+
+    def __init__(self, size: int):
+        """
+        Initiate the ring buffer.
+
+        :param size: The most values to keep.
+        """
+        self.size = size
+        self._values = [0.0] * size
+        self._next = 0
+        self._count = 0
+
+    def append(self, value: float) -> None:
+        """
+        Add a value, replacing the oldest one if full.
+
+        :param value: A float.
+        :return: None.
+        """
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def values(self) -> list[float]:
+        """
+        Get the values kept.
+
+        :return: A list of floats, oldest first.
+        """
+        if self._count < self.size:
+            return self._values[:self._count]
+        return self._values[self._next:] + self._values[:self._next]
+
+    def clear(self) -> None:
+        """
+        Forget every value.
+
+        :return: None.
+        """
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        """
+        Get how many values are kept.
+
+        :return: An int.
+        """
+        return self._count
+
+
+class FrameMetrics:
+    """
+    Keeps how long frames spend between every stage, and how many frames and
+    bytes arrive every second.
+
+    Frames are timestamped with time.perf_counter() in their times dict as
+    they go through each stage in STAGES. Call received() when a frame
+    arrives, and record() once it has been shown.
+    """
+
+    def __init__(self, history: int = 300):
+        """
+        Initiate the metrics.
+
+        :param history: How many frames and seconds to keep.
+        """
+        self.history = history
+        self.latencies = {name: RingBuffer(history) for name in INTERVALS}
+        self.frames_per_sec = RingBuffer(history)
+        self.bits_per_sec = RingBuffer(history)
+        self._arrivals = RingBuffer(history)
+        self._sizes = RingBuffer(history)
+        self._shown = RingBuffer(history)
+        self.stream_latency: Optional[float] = None
+        self._second: Optional[int] = None
+        self._second_frames = 0
+        self._second_bytes = 0
+        self._lock = Lock()
+
+    def received(self, frame: Frame) -> None:
+        """
+        Count a frame that arrived, for the throughput.
+
+        :param frame: A Frame.
+        :return: None.
+        """
+        now = frame.times.get("received", perf_counter())
+        second = int(now)
+        with self._lock:
+            self._arrivals.append(now)
+            self._sizes.append(frame.size)
+            if self._second is None:
+                self._second = second
+            if second > self._second:
+                # Seconds with no frames at all count as zeroes
+                for _ in range(min(second - self._second, self.history)):
+                    self.frames_per_sec.append(self._second_frames)
+                    self.bits_per_sec.append(self._second_bytes * 8)
+                    self._second_frames = 0
+                    self._second_bytes = 0
+                self._second = second
+            self._second_frames += 1
+            self._second_bytes += frame.size
+
+    def record(self, frame: Frame) -> None:
+        """
+        Record the latencies of a frame that has been shown. If the frame
+        has a local_time, the stream latency from capture to now is also
+        kept, in milliseconds.
+
+        :param frame: A Frame.
+        :return: None.
+        """
+        times = frame.times
+        if frame.local_time is not None:
+            self.stream_latency = unix() * 1000 - frame.local_time
+        with self._lock:
+            self._shown.append(times.get("rendered", perf_counter()))
+            for name, (start, end) in INTERVALS.items():
+                if start in times and end in times:
+                    self.latencies[name].append(times[end] - times[start])
+
+    def percentiles(self, name: str) -> dict[int, Optional[float]]:
+        """
+        Get the percentiles of a latency.
+
+        :param name: The name of the latency, from INTERVALS.
+        :return: A dict of the percentiles in PERCENTILES to seconds, which
+         are None if no frames were recorded.
+        """
+        with self._lock:
+            values = self.latencies[name].values()
+        return {p: percentile(values, p) for p in PERCENTILES}
+
+    def throughput(self, window: float = 1) -> tuple[float, float]:
+        """
+        Get how fast frames have been arriving lately.
+
+        :param window: How many seconds back to look.
+        :return: A tuple of the frames per second and megabits per second.
+        """
+        since = perf_counter() - window
+        frames = 0
+        size = 0
+        with self._lock:
+            for arrived, frame_size in zip(self._arrivals.values(),
+                                           self._sizes.values()):
+                if arrived >= since:
+                    frames += 1
+                    size += frame_size
+        return frames / window, size * 8 / window / 1_000_000
+
+    def shown_per_sec(self, window: float = 1) -> float:
+        """
+        Get how many frames have been shown every second lately.
+
+        :param window: How many seconds back to look.
+        :return: The frames per second.
+        """
+        since = perf_counter() - window
+        with self._lock:
+            shown = sum(1 for when in self._shown.values() if when >= since)
+        return shown / window
+
+    def series(self, name: str) -> list[float]:
+        """
+        Get the history of a latency or throughput, for graphing.
+
+        :param name: The name of a latency from INTERVALS, "fps" or "mbps".
+        :return: A list of floats, oldest first.
+        """
+        with self._lock:
+            if name == "fps":
+                return self.frames_per_sec.values()
+            if name == "mbps":
+                return [bits / 1_000_000
+                        for bits in self.bits_per_sec.values()]
+            return self.latencies[name].values()
+
+    def clear(self) -> None:
+        """
+        Forget everything, like after reconnecting.
+
+        :return: None.
+        """
+        with self._lock:
+            for buffer in self.latencies.values():
+                buffer.clear()
+            for buffer in (self.frames_per_sec, self.bits_per_sec,
+                           self._arrivals, self._sizes, self._shown):
+                buffer.clear()
+            self._second = None
+            self.stream_latency = None
+            self._second_frames = 0
+            self._second_bytes = 0
@@ -0,0 +1,311 @@
+"""
+A module that exports the metrics of PiCams on a background thread, to a
+rolling JSONL file and/or a Prometheus text endpoint on localhost, so viewers
+nobody is looking at can still be monitored.
+"""
+
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps as dump_json
+from pathlib import Path
+from threading import Thread, Event, Lock
+from time import time as unix
+from typing import Callable, Optional, Union
+
+from clock_sync import ClockSync
+from create_logger import create_logger
+from frame_buffer import FrameBuffer
+from frame_pipeline import FramePipeline
+from metrics import FrameMetrics, INTERVALS
+from picam import RemotePiCam
+from reconnect import ReconnectSupervisor
+from settings_worker import SettingsWorker
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+Snapshot = dict[str, dict[str, Union[float, dict]]]
+
+# The help text of every metric exported to Prometheus
+METRIC_HELP = {
+    "connected": "Whether the PiCam is connected.",
+    "frames_per_second": "Frames arriving per second.",
+    "shown_per_second": "Frames shown per second.",
+    "bytes_per_second": "Bytes of frames arriving per second.",
+    "frames_received": "Frames shown since connecting.",
+    "buffer_frames": "Compressed frames waiting in the frame buffer.",
+    "buffer_bytes": "Bytes of compressed frames in the frame buffer.",
+    "image_queue": "Decoded frames waiting to be shown.",
+    "upstream_drops": "Frames dropped by the PiCam.",
+    "pipeline_drops": "Frames dropped by the decode pipeline.",
+    "late_drops": "Frames dropped for finishing decoding too late.",
+    "buffer_drops": "Frames dropped by the frame buffer.",
+    "reconnects": "Times the connection to the PiCam was lost.",
+    "settings_round_trip_seconds": "Seconds the last settings call took.",
+    "settings_calls": "Settings calls sent to the PiCam.",
+    "latency_seconds": "Seconds frames spend in each stage.",
+    "stream_latency_seconds": "Seconds from capture to showing the last "
+                              "frame.",
+    "clock_error_seconds": "Seconds the stream latency can be wrong by."
+}
+# The metrics that only ever go up, until the viewer or PiCam restarts
+COUNTERS = ("frames_received", "upstream_drops", "pipeline_drops",
+            "late_drops", "buffer_drops", "reconnects", "settings_calls")
+
+
+def collect_camera_metrics(
+        cam: RemotePiCam, metrics: FrameMetrics,
+        frame_buffer: Optional[FrameBuffer] = None,
+        pipeline: Optional[FramePipeline] = None,
+        supervisor: Optional[ReconnectSupervisor] = None,
+        settings_worker: Optional[SettingsWorker] = None,
+        clock: Optional[ClockSync] = None
+) -> dict[str, Union[float, dict]]:
+    """
+    Collect the metrics of one PiCam. This only reads counters, so it is
+    safe to call from any thread.
+
+    :param cam: The RemotePiCam.
+    :param metrics: The FrameMetrics of the PiCam's frames.
+    :param frame_buffer: The FrameBuffer of the PiCam, if any.
+    :param pipeline: The FramePipeline of the PiCam, if any.
+    :param supervisor: The ReconnectSupervisor of the PiCam, if any.
+    :param settings_worker: The SettingsWorker of the PiCam, if any.
+    :param clock: The ClockSync of the PiCam, if any. The stream latency is
+     only exported once it is synced, since it is meaningless before.
+    :return: A dict of metric names to numbers. "latency_seconds" is a dict
+     of stage names to dicts of percentiles to seconds.
+    """
+    fps, mbps = metrics.throughput()
+    values = {
+        "connected": int(cam.is_connected),
+        "frames_per_second": fps,
+        "shown_per_second": metrics.shown_per_sec(),
+        "bytes_per_second": mbps * 1_000_000 / 8,
+        "upstream_drops": cam.upstream_drops,
+        "latency_seconds": {
+            name: {p: value
+                   for p, value in metrics.percentiles(name).items()
+                   if value is not None}
+            for name in INTERVALS
+        }
+    }
+    if frame_buffer is not None:
+        values["buffer_frames"] = frame_buffer.qsize()
+        values["buffer_bytes"] = frame_buffer.bytes
+        values["buffer_drops"] = sum(frame_buffer.dropped.values()) + \
+            sum(frame_buffer.late.values())
+    if pipeline is not None:
+        values["image_queue"] = pipeline.output.qsize()
+        values["pipeline_drops"] = pipeline.dropped_frames
+        values["late_drops"] = pipeline.late_frames
+    if supervisor is not None:
+        values["reconnects"] = supervisor.outages
+    if settings_worker is not None:
+        values["settings_calls"] = settings_worker.calls
+        if settings_worker.last_round_trip is not None:
+            values["settings_round_trip_seconds"] = \
+                settings_worker.last_round_trip
+    if clock is not None and clock.synced and \
+            metrics.stream_latency is not None:
+        values["stream_latency_seconds"] = metrics.stream_latency / 1000
+        values["clock_error_seconds"] = clock.error / 1000
+    return values
+
+
+def prometheus_text(snapshot: Snapshot) -> str:
+    """
+    Format a snapshot of metrics in the Prometheus text format. Metrics in
+    COUNTERS are exported as counters ending in _total. The latency
+    percentiles only cover the last frames rather than every frame, so they
+    are exported as gauges with a quantile label instead of a summary.
+
+    :param snapshot: A dict of camera names to their metrics, like from
+     collect_camera_metrics().
+    :return: A str.
+    """
+    lines = []
+    names = []
+    for values in snapshot.values():
+        names += [name for name in values if name not in names]
+    for name in names:
+        metric = f"picam_{name}"
+        if name in COUNTERS:
+            metric += "_total"
+        lines.append(f"# HELP {metric} {METRIC_HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} "
+                     f"{'counter' if name in COUNTERS else 'gauge'}")
+        for camera, values in snapshot.items():
+            value = values.get(name)
+            label = f"camera=\"{escape_label(camera)}\""
+            if isinstance(value, dict):
+                for stage, percentiles in value.items():
+                    for p, seconds in percentiles.items():
+                        lines.append(f"{metric}{{{label},stage=\"{stage}\","
+                                     f"quantile=\"{int(p) / 100}\"}} "
+                                     f"{seconds}")
+            elif value is not None:
+                lines.append(f"{metric}{{{label}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def escape_label(value: str) -> str:
+    """
+    Escape a Prometheus label value.
+
+    :param value: A str.
+    :return: The escaped str.
+    """
+    return value.replace("\\", "\\\\").replace("\"", "\\\"") \
+        .replace("\n", "\\n")
+
+
+class MetricsExporter:
+    """
+    Collects metrics every interval seconds on a background thread, and
+    appends them as a line of JSON to a file and/or serves them in the
+    Prometheus text format at http://127.0.0.1:<port>/metrics.
+
+    The file rolls over to path.1, path.2 and so on once it gets bigger than
+    max_size bytes, keeping backups old files.
+    """
+
+    def __init__(self, collect: Callable[[], Snapshot],
+                 interval: float = 10, path: Optional[Path] = None,
+                 max_size: int = 10 * 1024 * 1024, backups: int = 3,
+                 port: Optional[int] = None):
+        """
+        Initiate the exporter. Call start() to actually start exporting.
+
+        :param collect: A function that returns a dict of camera names to
+         their metrics. It is called on the exporter thread.
+        :param interval: How many seconds between collecting metrics.
+        :param path: The path of the JSONL file, or None to not write one.
+        :param max_size: The most bytes the file gets before rolling over.
+        :param backups: How many rolled over files to keep.
+        :param port: The port to serve Prometheus metrics on, or None to not
+         serve them.
+        """
+        self.collect = collect
+        self.interval = interval
+        self.path = path
+        self.max_size = max_size
+        self.backups = backups
+        self.port = port
+        self.exports = 0
+        self._text = ""
+        self._text_lock = Lock()
+        self._stop = Event()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> None:
+        """
+        Start the exporter thread, and the HTTP server if a port was given.
+        If the port can't be used, the error is logged and metrics are still
+        exported to the file.
+
+        :return: None.
+        """
+        if self.port is not None:
+            try:
+                self._server = ThreadingHTTPServer(("127.0.0.1", self.port),
+                                                   self._make_handler())
+            except OSError as e:
+                logger.error(f"Failed to serve Prometheus metrics on port "
+                             f"{self.port}: {e}")
+            else:
+                logger.info(f"Serving Prometheus metrics on port "
+                            f"{self.port}")
+                Thread(target=self._server.serve_forever,
+                       name="Metrics server", daemon=True).start()
+        logger.debug(f"Spawning metrics thread, exporting every "
+                     f"{self.interval} s")
+        Thread(target=self._run, name="Metrics exporter",
+               daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Stop exporting and close the HTTP server.
+
+        :return: None.
+        """
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _make_handler(self) -> type:
+        """
+        Make the request handler class of the HTTP server.
+
+        :return: A BaseHTTPRequestHandler subclass.
+        """
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                with exporter._text_lock:
+                    body = exporter._text.encode()
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                logger.debug(f"Metrics request: {format % args}")
+
+        return Handler
+
+    def _roll_over(self) -> None:
+        """
+        Move the file to path.1, path.1 to path.2 and so on, dropping the
+        oldest.
+
+        :return: None.
+        """
+        logger.debug(f"Rolling over metrics file {self.path}")
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                older.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def export(self) -> None:
+        """
+        Collect metrics once and export them.
+
+        :return: None.
+        """
+        snapshot = self.collect()
+        if self.port is not None:
+            text = prometheus_text(snapshot)
+            with self._text_lock:
+                self._text = text
+        if self.path is not None:
+            line = dump_json({"time": unix(), "cameras": snapshot}) + "\n"
+            if self.path.exists() and \
+                    self.path.stat().st_size + len(line) > self.max_size:
+                self._roll_over()
+            with self.path.open("a") as file:
+                file.write(line)
+        self.exports += 1
+
+    def _run(self) -> None:
+        """
+        Keep exporting until stopped.
+
+        :return: None.
+        """
+        while not self._stop.is_set():
+            try:
+                self.export()
+            except Exception as e:
+                logger.warning(f"Failed to export metrics: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,158 @@
+"""
+A module that streams pan/tilt positions to a PiCam at a capped rate, for
+continuous control with the keyboard or mouse.
+"""
+
+import logging
+from collections import deque
+from threading import Thread, Condition
+from time import perf_counter, sleep
+from typing import Optional
+
+from create_logger import create_logger
+from picam import RemotePiCam
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+
+class ServoController:
+    """
+    Sends the latest wanted pan/tilt position to a PiCam on a worker thread,
+    at most max_rate times a second.
+
+    Only one command is in flight at a time. Positions that get replaced
+    before they are sent are skipped, so the servos never fall behind the
+    controls.
+    """
+
+    def __init__(self, cam: RemotePiCam, max_rate: float = 20,
+                 history: int = 100):
+        """
+        Initiate the controller. Call start() to actually start sending.
+
+        :param cam: The RemotePiCam to move.
+        :param max_rate: The most commands to send per second.
+        :param history: How many command to acknowledgement latencies to
+         keep.
+        """
+        self.cam = cam
+        self.max_rate = max_rate
+        self.latencies = deque(maxlen=history)
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+        self._condition = Condition()
+        self._target: Optional[tuple[float, float]] = None
+        self._sent_position: Optional[tuple[float, float]] = None
+        self._busy = False
+
+    def start(self) -> None:
+        """
+        Start the worker thread.
+
+        :return: None.
+        """
+        logger.debug(f"Spawning servo thread for PiCam {repr(self.cam.name)}")
+        t = Thread(target=self._run, name=f"Servos {self.cam.name}",
+                   daemon=True)
+        t.start()
+
+    def _clamp(self, axis: str, value: float) -> float:
+        """
+        Keep a position inside the range of a servo.
+
+        :param axis: "pan" or "tilt".
+        :param value: The wanted position.
+        :return: The position inside the range.
+        """
+        servo = self.cam.settings["servos"][axis]
+        return min(max(value, servo["min"]), servo["max"])
+
+    @property
+    def position(self) -> tuple[float, float]:
+        """
+        Get where the servos are going, which is the latest position asked
+        for, or where they are if nothing is waiting to be sent.
+
+        :return: A tuple of the pan and tilt.
+        """
+        servos = self.cam.settings["servos"]
+        current = servos["pan"]["value"], servos["tilt"]["value"]
+        with self._condition:
+            if self._target is not None:
+                return self._target
+            # Keep the fractions of small nudges unless the servos were moved
+            # some other way since
+            sent = self._sent_position
+            if sent is not None and (self._busy or
+                                     tuple(round(p) for p in sent) ==
+                                     current):
+                return sent
+        return current
+
+    def move_to(self, pan: float, tilt: float) -> None:
+        """
+        Ask for the servos to move to a position.
+
+        :param pan: The pan position.
+        :param tilt: The tilt position.
+        :return: None.
+        """
+        target = self._clamp("pan", pan), self._clamp("tilt", tilt)
+        with self._condition:
+            if self._target is not None:
+                self.skipped += 1
+            self._target = target
+            self._condition.notify()
+
+    def nudge(self, pan: float, tilt: float) -> None:
+        """
+        Ask for the servos to move by some amount from where they are going.
+
+        :param pan: How much to pan by.
+        :param tilt: How much to tilt by.
+        :return: None.
+        """
+        current_pan, current_tilt = self.position
+        self.move_to(current_pan + pan, current_tilt + tilt)
+
+    def _run(self) -> None:
+        """
+        Keep sending the latest position.
+
+        :return: None.
+        """
+        while True:
+            with self._condition:
+                while self._target is None:
+                    self._condition.wait()
+                self._sent_position = self._target
+                self._target = None
+                self._busy = True
+            pan, tilt = (round(p) for p in self._sent_position)
+            start = perf_counter()
+            try:
+                if not self.cam.move_servos(pan, tilt):
+                    logger.warning(f"PiCam did not move servos to {pan}, "
+                                   f"{tilt}")
+                    self.failed += 1
+            except Exception as e:
+                logger.warning(f"Failed to move servos: {e}")
+                self.failed += 1
+            took = perf_counter() - start
+            with self._condition:
+                self._busy = False
+            self.latencies.append(took)
+            self.sent += 1
+            sleep(max(1 / self.max_rate - took, 0))
+
+    @property
+    def last_latency(self) -> Optional[float]:
+        """
+        Get how many seconds the last command took to be acknowledged.
+
+        :return: A float, or None if nothing was sent yet.
+        """
+        if len(self.latencies) == 0:
+            return None
+        return self.latencies[-1]
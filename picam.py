@@ -1,16 +1,418 @@
 import logging
 import struct
-from io import BytesIO
-from socket import socket, AF_INET, SOCK_DGRAM
-from typing import Union
+from copy import deepcopy
+from io import RawIOBase
+from json import loads as load_json, dumps as dump_json
+from socket import socket, create_connection, AF_INET, SOCK_DGRAM, \
+    SOL_SOCKET, SO_REUSEADDR
+from threading import RLock
+from time import perf_counter
+from typing import Union, Optional
 
 import networkzero as nw0
+import zmq
 from PIL import Image
 
+from buffer_pool import BufferPool
 from create_logger import create_logger
 
 logger = create_logger(name=__name__, level=logging.DEBUG)
 
+# Version 1 frame header: frame time and payload length
+HEADER_FORMAT = "<QL"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# Version 2 frame header: frame time, payload length, sequence number, width,
+# height, codec and flags
+HEADER_V2_FORMAT = "<QLLHHBB"
+HEADER_V2_SIZE = struct.calcsize(HEADER_V2_FORMAT)
+PROTOCOL_VERSION = 2
+# How many seconds to wait for the PiCam to reply on the settings channel
+REPLY_TIMEOUT = 5
+
+CODEC_JPEG = 0
+CODECS = {
+    CODEC_JPEG: "JPEG"
+}
+
+DEFAULT_SETTINGS = {
+    "awb_mode": {
+        "selected": "auto",
+        "available": [
+            "off",
+            "auto",
+            "sunlight",
+            "cloudy",
+            "shade",
+            "tungsten",
+            "fluorescent",
+            "incandescent",
+            "flash",
+            "horizon"
+        ]
+    },
+    "brightness": {
+        "min": 0,
+        "max": 100,
+        "value": 50
+    },
+    "contrast": {
+        "min": -100,
+        "max": 100,
+        "value": 0
+    },
+    "effect": {
+        "selected": "none",
+        "available": [
+            "none",
+            "negative",
+            "solarize",
+            "sketch",
+            "denoise",
+            "emboss",
+            "oilpaint",
+            "hatch",
+            "gpen",
+            "pastel",
+            "watercolor",
+            "film",
+            "blur",
+            "saturation",
+            "colorswap",
+            "washedout",
+            "posterise",
+            "colorpoint",
+            "colorbalance",
+            "cartoon",
+            "deinterlace1",
+            "deinterlace2"
+        ]
+    },
+    "iso": {
+        "selected": 0,
+        "available": [
+            0,
+            100,
+            200,
+            320,
+            400,
+            500,
+            640,
+            800
+        ]
+    },
+    "resolution": {
+        "selected": (720, 480),
+        "available": [
+            "128x96",
+            "160x120",
+            "160x144",
+            "176x144",
+            "180x132",
+            "180x135",
+            "192x144",
+            "234x60",
+            "256x192",
+            "320x200",
+            "320x240",
+            "320x288",
+            "320x400",
+            "352x288",
+            "352x240",
+            "384x256",
+            "384x288",
+            "392x72",
+            "400x300",
+            "460x55",
+            "480x320",
+            "468x32",
+            "468x60",
+            "512x342",
+            "512x384",
+            "544x372",
+            "640x350",
+            "640x480",
+            "640x576",
+            "704x576",
+            "720x350",
+            "720x400",
+            "720x480",
+            "720x483",
+            "720x484",
+            "720x486",
+            "720x540",
+            "720x576",
+            "729x348",
+            "768x576",
+            "800x600",
+            "832x624",
+            "856x480",
+            "896x600",
+            "960x720",
+            "1024x576",
+            "1024x768",
+            "1080x720",
+            "1152x768",
+            "1152x864",
+            "1152x870",
+            "1152x900",
+            "1280x720",
+            "1280x800",
+            "1280x854",
+            "1280x960",
+            "1280x992",
+            "1280x1024",
+            "1360x766",
+            "1365x768",
+            "1366x768",
+            "1365x1024",
+            "1400x788",
+            "1400x1050",
+            "1440x900",
+            "1520x856",
+            "1536x1536",
+            "1600x900",
+            "1600x1024",
+            "1600x1200",
+            "1792x1120",
+            "1792x1344",
+            "1824x1128",
+            "1824x1368",
+            "1856x1392",
+            "1920x1080",
+            "1920x1200",
+            "1920x1440",
+            "2000x1280",
+            "2048x1152",
+            "2048x1536",
+            "2048x2048",
+            "2500x1340",
+            "2560x1600",
+            "3072x2252",
+            "3600x2400"
+        ]
+    },
+    "saturation": {
+        "min": -100,
+        "max": 100,
+        "value": 0
+    },
+    "servos": {
+        "enable": True,
+        "pan": {
+            "min": 0,
+            "max": 180,
+            "value": 90
+        },
+        "tilt": {
+            "min": 0,
+            "max": 60,
+            "value": 30
+        }
+    }
+}
+
+
+def diff_settings(old: dict, new: dict) -> dict:
+    """
+    Find what changed between two settings dicts.
+
+    :param old: The old settings dict.
+    :param new: The new settings dict.
+    :return: A nested dict with only the keys in new whose values are
+     different from old.
+    """
+    changes = {}
+    for key, value in new.items():
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            nested = diff_settings(old[key], value)
+            if len(nested) > 0:
+                changes[key] = nested
+        elif key not in old or old[key] != value:
+            changes[key] = value
+    return changes
+
+
+def apply_settings_diff(settings: dict, changes: dict) -> None:
+    """
+    Apply changes from diff_settings() to a settings dict in place.
+
+    :param settings: The settings dict to change.
+    :param changes: The changes.
+    :return: None.
+    """
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(settings.get(key), dict):
+            apply_settings_diff(settings[key], value)
+        else:
+            settings[key] = value
+
+
+def get_ip_addr() -> str:
+    """
+    Get the IP address of this machine.
+
+    :return: A str.
+    """
+    s = socket(AF_INET, SOCK_DGRAM)
+    try:
+        s.connect(("8.8.8.8", 80))
+        return s.getsockname()[0]
+    finally:
+        s.close()
+
+
+def send_message(address: str, message, timeout: float):
+    """
+    Send a networkzero message and wait for the reply, on a socket of its
+    own that is closed afterwards. networkzero keeps one socket per address
+    for every thread, and once a message to an address times out, that
+    socket can't send again until the late reply comes, so messages that
+    can time out are sent with this instead.
+
+    :param address: A networkzero address, like "192.168.1.2:9999".
+    :param message: Anything that can be turned into JSON.
+    :param timeout: How many seconds to wait for the reply.
+    :return: The reply.
+    :raises TimeoutError: If there was no reply in time.
+    """
+    sock = zmq.Context.instance().socket(zmq.REQ)
+    # Throw away the message if it can't be sent, instead of keeping it
+    # around until the context is closed
+    sock.setsockopt(zmq.LINGER, 0)
+    try:
+        sock.connect(f"tcp://{address}")
+        sock.send(dump_json(message).encode())
+        if sock.poll(timeout * 1000, zmq.POLLIN) == 0:
+            raise TimeoutError(f"No reply from {address} within {timeout} s")
+        return load_json(sock.recv().decode())
+    finally:
+        sock.close()
+
+
+class PayloadReader(RawIOBase):
+    """
+    A read-only file-like object over a memoryview so Pillow can read a frame
+    without copying it into a BytesIO first.
+    """
+
+    def __init__(self, view: memoryview):
+        """
+        Initiate the reader.
+
+        :param view: The memoryview to read from.
+        """
+        super().__init__()
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), len(self._view) - self._pos)
+        if size <= 0:
+            return 0
+        buffer[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 0:
+            self._pos = offset
+        elif whence == 1:
+            self._pos += offset
+        else:
+            self._pos = len(self._view) + offset
+        self._pos = max(self._pos, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+class Frame:
+    """
+    A single compressed frame from the PiCam. The payload lives in a buffer
+    borrowed from a BufferPool, so call release() once you are done with it.
+    Once the frame has been decoded, the decoded PIL.Image is stored in image.
+    The time.perf_counter() time the frame reached each stage, like "header"
+    and "received", is stored in times.
+
+    frame_time is always in the PiCam's clock, so it can be used to order
+    frames and time their transit. Once the frame time has been turned into
+    our clock, it is stored in local_time, which is only for working out
+    latencies.
+    """
+
+    def __init__(self, payload: memoryview, size: int, frame_time: int,
+                 buffer: Optional[bytearray] = None,
+                 pool: Optional[BufferPool] = None,
+                 sequence: Optional[int] = None, width: int = 0,
+                 height: int = 0, codec: int = CODEC_JPEG, flags: int = 0):
+        """
+        Initiate the frame.
+
+        :param payload: A memoryview of the JPEG data.
+        :param size: The size of the JPEG data in bytes.
+        :param frame_time: The frame's unix time in milliseconds.
+        :param buffer: The buffer the payload is a view of, if it came from a
+         pool.
+        :param pool: The pool to give the buffer back to on release().
+        :param sequence: The frame's sequence number, or None if the PiCam
+         only speaks the version 1 protocol.
+        :param width: The width of the frame, or 0 if unknown.
+        :param height: The height of the frame, or 0 if unknown.
+        :param codec: The codec the payload is compressed with.
+        :param flags: Flags the PiCam sent with the frame.
+        """
+        self.payload = payload
+        self.size = size
+        self.frame_time = frame_time
+        self.sequence = sequence
+        self.width = width
+        self.height = height
+        self.codec = codec
+        self.flags = flags
+        self._buffer = buffer
+        self._pool = pool
+        self.image: Optional[Image.Image] = None
+        self.times: dict[str, float] = {}
+        self.local_time: Optional[float] = None
+
+    def open(self) -> Image.Image:
+        """
+        Open the payload as a PIL.Image. Like Image.open(), this is lazy, so
+        the frame must not be released until the image is loaded.
+
+        :return: A PIL.Image.
+        """
+        return Image.open(PayloadReader(self.payload))
+
+    def release(self) -> None:
+        """
+        Give the buffer back to the pool. It's safe to call this more than
+        once.
+
+        :return: None.
+        """
+        if self._buffer is not None and self._pool is not None:
+            self.payload.release()
+            self._pool.release(self._buffer)
+        self._buffer = None
+        self._pool = None
+
+    @property
+    def released(self) -> bool:
+        """
+        Get whether this frame has been released or not.
+
+        :return: A bool.
+        """
+        return self._buffer is None
+
 
 class RemotePiCam:
     """
@@ -18,7 +420,8 @@ class RemotePiCam:
     PiCam.
     """
 
-    def __init__(self, cam_name: str, port: int):
+    def __init__(self, cam_name: str, port: int, buffer_count: int = 8,
+                 address: Optional[str] = None):
         """
         Initiate the PiCam. This does not actually connect to the PiCam until
         you call connect().
@@ -26,202 +429,34 @@ class RemotePiCam:
         :param cam_name: The name of the PiCamera. This is used to discover
          the camera.
         :param port: The port to listen on.
+        :param buffer_count: How many frame buffers to keep around for reuse.
+         This should be at least how many frames you hold on to at once.
+        :param address: The networkzero address the PiCam was last found at.
+         This is tried first before discovering the PiCam again.
         """
         self._cam_name = cam_name
-        self._cam_address = None
+        self._cam_address = address
         self._port = port
         self._server_socket = None
         self._connection = None
         self._connected = False
-        self.settings = {
-            "awb_mode": {
-                "selected": "auto",
-                "available": [
-                    "off",
-                    "auto",
-                    "sunlight",
-                    "cloudy",
-                    "shade",
-                    "tungsten",
-                    "fluorescent",
-                    "incandescent",
-                    "flash",
-                    "horizon"
-                ]
-            },
-            "brightness": {
-                "min": 0,
-                "max": 100,
-                "value": 50
-            },
-            "contrast": {
-                "min": -100,
-                "max": 100,
-                "value": 0
-            },
-            "effect": {
-                "selected": "none",
-                "available": [
-                    "none",
-                    "negative",
-                    "solarize",
-                    "sketch",
-                    "denoise",
-                    "emboss",
-                    "oilpaint",
-                    "hatch",
-                    "gpen",
-                    "pastel",
-                    "watercolor",
-                    "film",
-                    "blur",
-                    "saturation",
-                    "colorswap",
-                    "washedout",
-                    "posterise",
-                    "colorpoint",
-                    "colorbalance",
-                    "cartoon",
-                    "deinterlace1",
-                    "deinterlace2"
-                ]
-            },
-            "iso": {
-                "selected": 0,
-                "available": [
-                    0,
-                    100,
-                    200,
-                    320,
-                    400,
-                    500,
-                    640,
-                    800
-                ]
-            },
-            "resolution": {
-                "selected": (720, 480),
-                "available": [
-                    "128x96",
-                    "160x120",
-                    "160x144",
-                    "176x144",
-                    "180x132",
-                    "180x135",
-                    "192x144",
-                    "234x60",
-                    "256x192",
-                    "320x200",
-                    "320x240",
-                    "320x288",
-                    "320x400",
-                    "352x288",
-                    "352x240",
-                    "384x256",
-                    "384x288",
-                    "392x72",
-                    "400x300",
-                    "460x55",
-                    "480x320",
-                    "468x32",
-                    "468x60",
-                    "512x342",
-                    "512x384",
-                    "544x372",
-                    "640x350",
-                    "640x480",
-                    "640x576",
-                    "704x576",
-                    "720x350",
-                    "720x400",
-                    "720x480",
-                    "720x483",
-                    "720x484",
-                    "720x486",
-                    "720x540",
-                    "720x576",
-                    "729x348",
-                    "768x576",
-                    "800x600",
-                    "832x624",
-                    "856x480",
-                    "896x600",
-                    "960x720",
-                    "1024x576",
-                    "1024x768",
-                    "1080x720",
-                    "1152x768",
-                    "1152x864",
-                    "1152x870",
-                    "1152x900",
-                    "1280x720",
-                    "1280x800",
-                    "1280x854",
-                    "1280x960",
-                    "1280x992",
-                    "1280x1024",
-                    "1360x766",
-                    "1365x768",
-                    "1366x768",
-                    "1365x1024",
-                    "1400x788",
-                    "1400x1050",
-                    "1440x900",
-                    "1520x856",
-                    "1536x1536",
-                    "1600x900",
-                    "1600x1024",
-                    "1600x1200",
-                    "1792x1120",
-                    "1792x1344",
-                    "1824x1128",
-                    "1824x1368",
-                    "1856x1392",
-                    "1920x1080",
-                    "1920x1200",
-                    "1920x1440",
-                    "2000x1280",
-                    "2048x1152",
-                    "2048x1536",
-                    "2048x2048",
-                    "2500x1340",
-                    "2560x1600",
-                    "3072x2252",
-                    "3600x2400"
-                ]
-            },
-            "saturation": {
-                "min": -100,
-                "max": 100,
-                "value": 0
-            },
-            "servos": {
-                "enable": True,
-                "pan": {
-                    "min": 0,
-                    "max": 180,
-                    "value": 90
-                },
-                "tilt": {
-                    "min": 0,
-                    "max": 60,
-                    "value": 30
-                }
-            }
-        }
-
-    def _get_ip_addr(self) -> str:
-        """
-        Get the IP address of this machine.
-
-        :return: A str.
-        """
-        s = socket(AF_INET, SOCK_DGRAM)
-        try:
-            s.connect(("8.8.8.8", 80))
-            return s.getsockname()[0]
-        finally:
-            s.close()
+        self.protocol = 1
+        self.capabilities = {}
+        self.settings_version: Optional[int] = None
+        self._synced_settings = {}
+        self._settings_lock = RLock()
+        self.upstream_drops = 0
+        self.drain_only = False
+        self.frames_drained = 0
+        self._last_sequence: Optional[int] = None
+        self._header = bytearray(HEADER_SIZE)
+        self._received = 0
+        self._frame_info = ()
+        self._header_time = 0.0
+        self._buffer: Optional[bytearray] = None
+        self._payload: Optional[memoryview] = None
+        self.buffer_pool = BufferPool(count=buffer_count)
+        self.settings = deepcopy(DEFAULT_SETTINGS)
 
     def connect(self, timeout: int = 30) -> bool:
         """
@@ -232,26 +467,277 @@ class RemotePiCam:
         """
         logger.debug(f"Attempting to connect to a PiCam with name "
                      f"{self._cam_name}")
-        try:
-            service = nw0.discover(self._cam_name, timeout)
-        except nw0.core.SocketTimedOutError:
-            return False
+        # Forget what the last PiCam supported, it may have been replaced by
+        # an older one that doesn't send capabilities at all
+        self.capabilities = {}
+        self.settings_version = None
+        if self._cam_address is not None and \
+                self._probe(self._cam_address, min(timeout, 1)):
+            logger.debug(f"Reusing last address {self._cam_address}")
+            service = self._cam_address
+        else:
+            try:
+                service = nw0.discover(self._cam_name, timeout)
+            except nw0.core.SocketTimedOutError:
+                return False
         if service is None:
             logger.warning("Failed to find PiCam")
             return False
         else:
             logger.info(f"Successfully connected to PiCam '{self._cam_name}' "
                         f"at address {service}")
-            logger.debug(f"Opening socket on port {self._port}")
-            self._server_socket = socket()
-            self._server_socket.bind(("0.0.0.0", self._port))
-            self._server_socket.listen(0)
-            self.settings = nw0.send_message_to(service, self._get_ip_addr())
+            self._listen()
             self._cam_address = service
-            self._connection = self._server_socket.accept()[0].makefile("rb")
+            try:
+                self._set_settings(send_message(service, get_ip_addr(),
+                                                REPLY_TIMEOUT))
+            except TimeoutError:
+                logger.warning("PiCam never replied to connecting")
+                return False
+            self._negotiate_protocol()
+            self._connection = self._server_socket.accept()[0]
             self._connected = True
             return True
 
+    def _probe(self, address: str, timeout: float) -> bool:
+        """
+        Check if our PiCam is still at a networkzero address. Something else
+        may be listening there by now, so the PiCam is asked for its name
+        too, but only once we know something is listening. PiCams that don't
+        reply in time, or don't know their name, are discovered again.
+
+        :param address: A networkzero address, like "192.168.1.2:9999".
+        :param timeout: How many seconds to wait.
+        :return: A bool on whether the PiCam is there.
+        """
+        host, port = address.rsplit(":", 1)
+        try:
+            create_connection((host, int(port)), timeout=timeout).close()
+        except (OSError, ValueError):
+            logger.debug(f"Nothing listening at last address {address}")
+            return False
+        try:
+            name = send_message(address, {"command": "name"}, timeout)
+        except (TimeoutError, zmq.ZMQError, ValueError):
+            name = None
+        if name != self._cam_name:
+            logger.debug(f"Something other than PiCam "
+                         f"{repr(self._cam_name)} is at last address "
+                         f"{address}")
+            return False
+        return True
+
+    def _listen(self) -> None:
+        """
+        Open the socket the PiCam connects back to, if it isn't already. It
+        stays open between connections, so reconnecting doesn't have to wait
+        for the port to be free again.
+
+        :return: None.
+        """
+        if self._server_socket is not None:
+            return
+        logger.debug(f"Opening socket on port {self._port}")
+        self._server_socket = socket()
+        self._server_socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self._server_socket.bind(("0.0.0.0", self._port))
+        self._server_socket.listen(1)
+
+    def _set_settings(self, settings: dict) -> None:
+        """
+        Set the settings from a PiCam reply. Newer PiCams also say what they
+        support in a "capabilities" key, which is kept separately.
+
+        :param settings: The settings dict from the PiCam.
+        :return: None.
+        """
+        if "capabilities" in settings:
+            self.capabilities = settings.pop("capabilities")
+            self.settings_version = self.capabilities.get("settings_version")
+        self.settings = settings
+        self._synced_settings = deepcopy(settings)
+
+    def supports(self, command: str) -> bool:
+        """
+        Get whether the PiCam understands a command.
+
+        :param command: The name of the command.
+        :return: A bool.
+        """
+        return command in self.capabilities.get("commands", [])
+
+    def _send_command(self, command: str, timeout: float = REPLY_TIMEOUT,
+                      **kwargs):
+        """
+        Send a command to the PiCam over the settings channel. Only PiCams
+        that list the command in their capabilities understand these.
+
+        :param command: The name of the command.
+        :param timeout: How many seconds to wait for the reply.
+        :param kwargs: Arguments for the command.
+        :return: Whatever the PiCam replied with.
+        :raises TimeoutError: If the PiCam didn't reply in time.
+        """
+        return send_message(self._cam_address,
+                            {"command": command} | kwargs, timeout)
+
+    def _negotiate_protocol(self) -> None:
+        """
+        Agree on a frame header version with the PiCam, falling back to
+        version 1 if the PiCam doesn't support anything newer.
+
+        :return: None.
+        """
+        self.protocol = 1
+        if PROTOCOL_VERSION in self.capabilities.get("protocol", []):
+            self.protocol = int(self._send_command("protocol",
+                                                   version=PROTOCOL_VERSION))
+        logger.debug(f"Using protocol version {self.protocol}")
+        self._header = bytearray(HEADER_V2_SIZE if self.protocol >= 2
+                                 else HEADER_SIZE)
+        self._received = 0
+        self._last_sequence = None
+
+    def _unpack_header(self) -> int:
+        """
+        Unpack the received header and remember the frame info.
+
+        :return: The length of the payload.
+        """
+        if self.protocol >= 2:
+            frame_time, img_len, sequence, width, height, codec, flags = \
+                struct.unpack(HEADER_V2_FORMAT, self._header)
+            if self._last_sequence is not None and \
+                    sequence > self._last_sequence + 1:
+                self.upstream_drops += sequence - self._last_sequence - 1
+            self._last_sequence = sequence
+            self._frame_info = (frame_time, sequence, width, height, codec,
+                                flags)
+        else:
+            frame_time, img_len = struct.unpack(HEADER_FORMAT, self._header)
+            self._frame_info = (frame_time, )
+        return img_len
+
+    def _feed(self) -> Union[Frame, None]:
+        """
+        Receive once from the connection into the frame currently being read.
+
+        :return: A Frame if this completed one, otherwise None.
+        """
+        if self._payload is None:
+            got = self._connection.recv_into(
+                memoryview(self._header)[self._received:]
+            )
+            if got == 0:
+                raise ConnectionError("Connection closed by PiCam")
+            self._received += got
+            if self._received < len(self._header):
+                return None
+            self._header_time = perf_counter()
+            img_len = self._unpack_header()
+            if img_len == 0:
+                raise ValueError("No more data is being sent, closing")
+            self._buffer = self.buffer_pool.acquire(img_len)
+            self._payload = memoryview(self._buffer)[:img_len]
+            self._received = 0
+            return None
+        got = self._connection.recv_into(self._payload[self._received:])
+        if got == 0:
+            raise ConnectionError("Connection closed by PiCam")
+        self._received += got
+        if self._received < len(self._payload):
+            return None
+        if self.drain_only:
+            self.frames_drained += 1
+            self._payload.release()
+            self.buffer_pool.release(self._buffer)
+            self._payload = None
+            self._buffer = None
+            self._received = 0
+            return None
+        frame = Frame(self._payload, len(self._payload), self._frame_info[0],
+                      self._buffer, self.buffer_pool, *self._frame_info[1:])
+        frame.times["header"] = self._header_time
+        frame.times["received"] = perf_counter()
+        self._payload = None
+        self._buffer = None
+        self._received = 0
+        return frame
+
+    def _close_connection(self) -> None:
+        """
+        Close the connection and throw away any partially read frame. The
+        listening socket stays open until close() is called.
+
+        :return: None.
+        """
+        if self._buffer is not None:
+            self._payload.release()
+            self.buffer_pool.release(self._buffer)
+        self._payload = None
+        self._buffer = None
+        self._received = 0
+        if self._connection is not None:
+            self._connection.close()
+        self._connected = False
+
+    def get_frame(self) -> Union[Frame, None]:
+        """
+        Get a compressed frame from the PiCam. This blocks until a whole frame
+        has been received.
+
+        :return: A Frame, or None if disconnected. Call release() on the frame
+         when you are done with it.
+        """
+        if not self.is_connected:
+            raise ValueError("Not connected")
+        try:
+            frame = None
+            while frame is None:
+                frame = self._feed()
+            return frame
+        except Exception:
+            self._close_connection()
+        return None
+
+    def read_available(self) -> list[Frame]:
+        """
+        Read whatever is available on the connection without blocking. The
+        connection must have been made non-blocking with set_blocking(False).
+        If the connection fails, it is closed and is_connected becomes False.
+
+        :return: A list of Frames that were completed, which may be empty.
+        """
+        frames = []
+        try:
+            while True:
+                frame = self._feed()
+                if frame is not None:
+                    frames.append(frame)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except Exception:
+            self._close_connection()
+        return frames
+
+    def set_blocking(self, blocking: bool) -> None:
+        """
+        Set whether reading from the connection blocks or not.
+
+        :param blocking: A bool.
+        :return: None.
+        """
+        self._connection.setblocking(blocking)
+
+    def fileno(self) -> int:
+        """
+        Get the file descriptor of the connection, so the PiCam can be used
+        with the selectors module.
+
+        :return: An int.
+        """
+        return self._connection.fileno()
+
     def get_image(self) -> Union[tuple[Image.Image, int, int], None]:
         """
         Get an image from the PiCam.
@@ -259,40 +745,149 @@ class RemotePiCam:
         :return: A tuple of a PIL.Image, the size, and the frame's unix time in
          milliseconds, or None if disconnected.
         """
-        failed = False
-        if not self.is_connected:
-            raise ValueError("Not connected")
+        frame = self.get_frame()
+        if frame is None:
+            return None
         try:
-            ull_size = struct.calcsize("<Q")
-            frame_time = struct.unpack("<Q",
-                                       self._connection.read(ull_size))[0]
-            ul_size = struct.calcsize("<L")
-            img_len = struct.unpack("<L", self._connection.read(ul_size))[0]
-            if img_len == 0:
-                raise ValueError("No more data is being sent, closing")
-            img_stream = BytesIO()
-            img_stream.write(self._connection.read(img_len))
-            img_stream.seek(0)
-            img_pil = Image.open(img_stream)
-            return img_pil, img_len, frame_time
+            img_pil = frame.open()
+            img_pil.load()
         except Exception:
-            failed = True
+            self.disconnect()
+            return None
         finally:
-            if failed:
-                self._connection.close()
-                self._server_socket.close()
-                self._connected = False
-        return None
+            frame.release()
+        return img_pil, frame.size, frame.frame_time
+
+    def get_time(self, timeout: float = REPLY_TIMEOUT) -> tuple[float, float]:
+        """
+        Ask the PiCam what time it is. Only PiCams that support the "time"
+        command can answer.
+
+        :param timeout: How many seconds to wait for the reply.
+        :return: A tuple of when the PiCam got the request and when it
+         replied, in milliseconds since the epoch on the PiCam's clock.
+        :raises TimeoutError: If the PiCam didn't reply in time.
+        """
+        reply = self._send_command("time", timeout)
+        return reply["received"], reply["sent"]
+
+    def pause_stream(self, paused: bool) -> bool:
+        """
+        Pause or resume the stream. If the PiCam understands the "pause"
+        command it stops sending frames. Otherwise frames keep coming, but
+        they are thrown away as soon as they are read, without making Frames.
+
+        :param paused: Whether to pause or resume.
+        :return: A bool on whether the PiCam itself paused or resumed.
+        """
+        self.drain_only = paused
+        if not self.supports("pause"):
+            return False
+        result = self._send_command("pause", paused=paused)
+        return result["ok"]
+
+    def move_servos(self, pan: int, tilt: int) -> bool:
+        """
+        Move the pan/tilt servos. If the PiCam understands the "servo"
+        command only the two positions are sent, otherwise they are applied
+        like any other settings change, under the same lock the settings
+        worker uses.
+
+        :param pan: The new pan position.
+        :param tilt: The new tilt position.
+        :return: A bool on whether the servos were moved or not.
+        """
+        if not self.supports("servo"):
+            return self.apply_changes({"servos": {"pan": {"value": pan},
+                                                  "tilt": {"value": tilt}}})
+        with self._settings_lock:
+            result = self._send_command("servo", pan=pan, tilt=tilt)
+            if result["ok"]:
+                for settings in (self.settings, self._synced_settings):
+                    settings["servos"]["pan"]["value"] = pan
+                    settings["servos"]["tilt"]["value"] = tilt
+            if "version" in result:
+                self.settings_version = result["version"]
+            return result["ok"]
+
+    def apply_changes(self, changes: dict) -> bool:
+        """
+        Change some of the settings in one update. If the PiCam doesn't
+        accept all of them, or doesn't reply, the settings are rolled back to
+        how they were.
+
+        :param changes: A nested dict of the settings to change, like
+         {"brightness": {"value": 60}}.
+        :return: A bool on whether the changes were applied or not.
+        :raises TimeoutError: If the PiCam didn't reply in time.
+        """
+        with self._settings_lock:
+            previous = deepcopy(self.settings)
+            apply_settings_diff(self.settings, changes)
+            try:
+                accepted = self.update_settings()
+            except Exception:
+                self.settings = previous
+                raise
+            if accepted:
+                return True
+            logger.warning("PiCam did not accept the changes, rolling back")
+            # The PiCam replied with its settings, which may have some of the
+            # changes in them
+            partial = diff_settings(load_json(dump_json(self.settings)),
+                                    load_json(dump_json(previous)))
+            self.settings = previous
+            if len(partial) > 0 and not self.update_settings():
+                logger.warning("PiCam did not accept the rollback either")
+            return False
 
     def update_settings(self) -> bool:
         """
         Update the settings.
 
         :return: A bool on whether the settings were set or not.
+        :raises TimeoutError: If the PiCam didn't reply within REPLY_TIMEOUT
+         seconds.
+        """
+        with self._settings_lock:
+            if self.supports("settings_delta") and \
+                    self.settings_version is not None:
+                result = self._update_settings_delta()
+                if result is not None:
+                    return result
+                logger.warning("Settings version mismatch, sending all of "
+                               "the settings")
+            result = send_message(self._cam_address, self.settings,
+                                  REPLY_TIMEOUT)
+            self._set_settings(result[1])
+            return result[0]
+
+    def _update_settings_delta(self) -> Optional[bool]:
         """
-        result = nw0.send_message_to(self._cam_address, self.settings)
-        self.settings = result[1]
-        return result[0]
+        Send only the settings that changed since the PiCam last agreed with
+        us, along with the version of the settings those changes are based on.
+
+        :return: A bool on whether the settings were set or not, or None if
+         the PiCam had a different version and everything has to be sent.
+        """
+        # Go through JSON so tuples compare equal to the lists we got back
+        current = load_json(dump_json(self.settings))
+        changes = diff_settings(self._synced_settings, current)
+        if len(changes) == 0:
+            return True
+        logger.debug(f"Sending settings changes {changes} on top of version "
+                     f"{self.settings_version}")
+        result = self._send_command("settings_delta",
+                                    base_version=self.settings_version,
+                                    changes=changes)
+        if result.get("mismatch", False):
+            return None
+        self.settings_version = result["version"]
+        if result["ok"]:
+            self._synced_settings = current
+        else:
+            self.settings = deepcopy(self._synced_settings)
+        return result["ok"]
 
     def disconnect(self) -> None:
         """
@@ -301,9 +896,38 @@ class RemotePiCam:
         :return: None.
         """
         logger.warning("Disconnecting")
-        self._connection.close()
-        self._server_socket.close()
-        self._connected = False
+        self._close_connection()
+
+    def close(self) -> None:
+        """
+        Disconnect if needed and stop listening for the PiCam. Call this once
+        you are done with the PiCam for good.
+
+        :return: None.
+        """
+        if self.is_connected:
+            self.disconnect()
+        if self._server_socket is not None:
+            self._server_socket.close()
+            self._server_socket = None
+
+    @property
+    def address(self) -> Optional[str]:
+        """
+        Get the networkzero address the PiCam was last found at.
+
+        :return: A str, or None if the PiCam was never found.
+        """
+        return self._cam_address
+
+    @property
+    def name(self) -> str:
+        """
+        Get the name of the PiCam.
+
+        :return: A str.
+        """
+        return self._cam_name
 
     @property
     def is_connected(self) -> bool:
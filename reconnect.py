@@ -0,0 +1,160 @@
+"""
+A module that reconnects to a PiCam by itself after the connection drops.
+"""
+
+import logging
+import random
+from collections import deque
+from copy import deepcopy
+from json import loads as load_json, dumps as dump_json
+from threading import Thread, Event
+from time import perf_counter
+from typing import Callable, Optional
+
+from create_logger import create_logger
+from picam import RemotePiCam, diff_settings
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+
+class ReconnectSupervisor:
+    """
+    Keeps trying to reconnect to a PiCam with jittered exponential backoff,
+    and puts the camera settings back the way they were once it's back.
+    """
+
+    def __init__(self, cam: RemotePiCam, initial_delay: float = 0.5,
+                 max_delay: float = 30, factor: float = 2,
+                 history: int = 100):
+        """
+        Initiate the supervisor.
+
+        :param cam: The RemotePiCam to reconnect.
+        :param initial_delay: How many seconds to wait after the first failed
+         attempt.
+        :param max_delay: The most seconds to ever wait between attempts.
+        :param factor: How much longer to wait after every failed attempt.
+        :param history: How many recovery times to keep.
+        """
+        self.cam = cam
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.outages = 0
+        self.recovery_times: deque[float] = deque(maxlen=history)
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self, on_reconnected: Callable[[], None]) -> None:
+        """
+        Start reconnecting on a thread. Does nothing if we are already
+        reconnecting.
+
+        :param on_reconnected: A function to call on the reconnecting thread
+         once the PiCam is connected and its settings are back.
+        :return: None.
+        """
+        if self.reconnecting:
+            return
+        self.outages += 1
+        self._stop.clear()
+        logger.warning(f"Lost connection to PiCam {repr(self.cam.name)}, "
+                       f"reconnecting")
+        self._thread = Thread(target=self._reconnect,
+                              args=(deepcopy(self.cam.settings),
+                                    on_reconnected),
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop reconnecting.
+
+        :return: None.
+        """
+        self._stop.set()
+
+    def _reconnect(self, settings: dict,
+                   on_reconnected: Callable[[], None]) -> None:
+        """
+        Keep trying to reconnect until we succeed or are stopped.
+
+        :param settings: The settings to put back once reconnected.
+        :param on_reconnected: A function to call once reconnected, before
+         the settings are put back.
+        :return: None.
+        """
+        start = perf_counter()
+        delay = self.initial_delay
+        attempts = 0
+        while not self._try_connect():
+            attempts += 1
+            wait = random.uniform(delay / 2, delay)
+            logger.debug(f"Reconnect attempt {attempts} failed, trying "
+                         f"again in {round(wait, 2)} s")
+            if self._stop.wait(wait):
+                logger.info("Stopped reconnecting")
+                return
+            delay = min(delay * self.factor, self.max_delay)
+        if self._stop.is_set():
+            self.cam.disconnect()
+            return
+        recovery_time = perf_counter() - start
+        self.recovery_times.append(recovery_time)
+        logger.info(f"Reconnected to PiCam {repr(self.cam.name)} in "
+                    f"{round(recovery_time, 2)} s")
+        # Get frames flowing again first, the settings are only nice to have
+        on_reconnected()
+        self._restore_settings(settings)
+
+    def _restore_settings(self, settings: dict) -> None:
+        """
+        Put back the settings the PiCam had before the connection dropped.
+        Settings calls time out, so this can't hang, and failing is only
+        logged.
+
+        :param settings: The settings to put back.
+        :return: None.
+        """
+        changes = diff_settings(self.cam.settings,
+                                load_json(dump_json(settings)))
+        if len(changes) == 0:
+            return
+        logger.debug(f"Putting back settings {changes}")
+        try:
+            if not self.cam.apply_changes(changes):
+                logger.warning("PiCam did not accept the previous settings")
+        except Exception as e:
+            logger.warning(f"Failed to put back the previous settings: {e}")
+
+    def _try_connect(self) -> bool:
+        """
+        Try to connect to the PiCam once.
+
+        :return: A bool on whether we connected or not.
+        """
+        try:
+            return self.cam.connect(timeout=1)
+        except Exception as e:
+            logger.warning(f"Error while reconnecting: {e}")
+            return False
+
+    @property
+    def reconnecting(self) -> bool:
+        """
+        Get whether we are trying to reconnect right now.
+
+        :return: A bool.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def last_recovery_time(self) -> Optional[float]:
+        """
+        Get how many seconds it took to recover from the last outage.
+
+        :return: A float, or None if we never had to reconnect.
+        """
+        if len(self.recovery_times) == 0:
+            return None
+        return self.recovery_times[-1]
@@ -0,0 +1,128 @@
+"""
+A module that sends settings to a PiCam on a background thread, so the GUI
+doesn't freeze while waiting for the PiCam to reply.
+"""
+
+import logging
+from collections import deque
+from copy import deepcopy
+from threading import Thread, Condition
+from time import perf_counter
+from typing import Callable, Optional
+
+from create_logger import create_logger
+from picam import RemotePiCam, apply_settings_diff
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+SettingsCallback = Callable[[bool, Optional[Exception]], None]
+
+
+class SettingsWorker:
+    """
+    Sends settings changes to a PiCam one call at a time on a worker thread.
+
+    Changes submitted while a call is in flight are merged together, with
+    the latest value of each key winning, and sent in the next call. Every
+    callback of the merged changes is called with the result of that call.
+    """
+
+    def __init__(self, cam: RemotePiCam, history: int = 100):
+        """
+        Initiate the worker. Call start() to actually start sending.
+
+        :param cam: The RemotePiCam to send settings to.
+        :param history: How many round trip times to keep.
+        """
+        self.cam = cam
+        self.round_trip_times = deque(maxlen=history)
+        self.calls = 0
+        self.coalesced = 0
+        self._condition = Condition()
+        self._changes = {}
+        self._callbacks: list[SettingsCallback] = []
+        self._busy = False
+
+    def start(self) -> None:
+        """
+        Start the worker thread.
+
+        :return: None.
+        """
+        logger.debug(f"Spawning settings thread for PiCam "
+                     f"{repr(self.cam.name)}")
+        t = Thread(target=self._run, name=f"Settings {self.cam.name}",
+                   daemon=True)
+        t.start()
+
+    def submit(self, changes: dict,
+               on_done: Optional[SettingsCallback] = None) -> None:
+        """
+        Queue settings changes to send.
+
+        :param changes: A nested dict of the settings to change, like
+         {"brightness": {"value": 60}}.
+        :param on_done: A function that gets called on the worker thread
+         with whether the PiCam accepted the settings, and the exception if
+         sending failed.
+        :return: None.
+        """
+        with self._condition:
+            if len(self._changes) > 0:
+                self.coalesced += 1
+            apply_settings_diff(self._changes, deepcopy(changes))
+            if on_done is not None:
+                self._callbacks.append(on_done)
+            self._condition.notify()
+
+    def _run(self) -> None:
+        """
+        Keep sending queued changes.
+
+        :return: None.
+        """
+        while True:
+            with self._condition:
+                while len(self._changes) == 0:
+                    self._condition.wait()
+                changes = self._changes
+                callbacks = self._callbacks
+                self._changes = {}
+                self._callbacks = []
+                self._busy = True
+            logger.debug(f"Sending settings {changes}")
+            error = None
+            start = perf_counter()
+            try:
+                ok = self.cam.apply_changes(changes)
+            except Exception as e:
+                logger.warning(f"Failed to send settings: {e}")
+                ok = False
+                error = e
+            self.round_trip_times.append(perf_counter() - start)
+            self.calls += 1
+            with self._condition:
+                self._busy = False
+            for callback in callbacks:
+                callback(ok, error)
+
+    @property
+    def busy(self) -> bool:
+        """
+        Get whether there are settings being sent or waiting to be sent.
+
+        :return: A bool.
+        """
+        with self._condition:
+            return self._busy or len(self._changes) > 0
+
+    @property
+    def last_round_trip(self) -> Optional[float]:
+        """
+        Get how many seconds the last settings call took.
+
+        :return: A float, or None if nothing was sent yet.
+        """
+        if len(self.round_trip_times) == 0:
+            return None
+        return self.round_trip_times[-1]
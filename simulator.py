@@ -0,0 +1,430 @@
+"""
+A module that pretends to be a PiCam, so the viewer can be tested and
+benchmarked without a Raspberry Pi.
+
+Run it with `python simulator.py` and connect to it like a normal PiCam. Run
+`python simulator.py --help` for all the options.
+"""
+
+import logging
+import random
+import struct
+from argparse import ArgumentParser
+from copy import deepcopy
+from io import BytesIO
+from pathlib import Path
+from socket import socket
+from threading import Thread, Event, Lock
+from time import time as unix, sleep, perf_counter
+from typing import Optional
+
+import networkzero as nw0
+from PIL import Image, ImageDraw
+
+from create_logger import create_logger
+from picam import DEFAULT_SETTINGS, HEADER_FORMAT, HEADER_V2_FORMAT, \
+    PROTOCOL_VERSION, CODEC_JPEG, apply_settings_diff
+
+logger = create_logger(name=__name__, level=logging.DEBUG)
+
+
+def make_synthetic_frames(resolution: tuple[int, int],
+                          count: int = 30) -> list[bytes]:
+    """
+    Make a bunch of JPEG frames of a moving test pattern.
+
+    :param resolution: A tuple of the width and height.
+    :param count: How many frames to make. They are played in a loop.
+    :return: A list of JPEGs as bytes.
+    """
+    width, height = resolution
+    frames = []
+    for i in range(count):
+        image = Image.linear_gradient("L").resize((width, height))
+        image = Image.merge("RGB", (image, image.rotate(90).resize(
+            (width, height)), Image.new("L", (width, height), i * 8 % 256)))
+        draw = ImageDraw.Draw(image)
+        x = round(i / count * width)
+        draw.rectangle((x, 0, x + max(width // 20, 1), height),
+                       fill=(255, 255, 255))
+        draw.text((10, 10), f"Frame {i}", fill=(0, 0, 0))
+        stream = BytesIO()
+        image.save(stream, "JPEG")
+        frames.append(stream.getvalue())
+    return frames
+
+
+def load_frames(path: Path, resolution: tuple[int, int]) -> list[bytes]:
+    """
+    Load frames from an image or a directory of images, re-encoding them as
+    JPEGs of the requested resolution.
+
+    :param path: A path to an image or a directory of images.
+    :param resolution: A tuple of the width and height.
+    :return: A list of JPEGs as bytes.
+    """
+    paths = sorted(path.iterdir()) if path.is_dir() else [path]
+    frames = []
+    for p in paths:
+        try:
+            image = Image.open(p).convert("RGB").resize(resolution)
+        except OSError:
+            logger.warning(f"Skipping {p}, not an image")
+            continue
+        stream = BytesIO()
+        image.save(stream, "JPEG")
+        frames.append(stream.getvalue())
+    if len(frames) == 0:
+        raise ValueError(f"No images found in {path}")
+    return frames
+
+
+class PiCamSimulator:
+    """
+    Advertises itself over networkzero like a PiCam, answers settings
+    messages, and streams JPEGs back to the viewer in the same format.
+    """
+
+    def __init__(self, name: str = "picam", port: int = 7896,
+                 fps: float = 30, resolution: tuple[int, int] = (720, 480),
+                 jitter: float = 0, stall_chance: float = 0,
+                 stall_length: float = 0, drop_chance: float = 0,
+                 source: Optional[Path] = None,
+                 address: Optional[str] = None, clock_offset: float = 0,
+                 clock_drift: float = 0):
+        """
+        Initiate the simulator. Call start() to start advertising.
+
+        :param name: The name to advertise as.
+        :param port: The port the viewer is listening on.
+        :param fps: How many frames to send per second.
+        :param resolution: The starting resolution.
+        :param jitter: Up to how many milliseconds to randomly delay each
+         frame by.
+        :param stall_chance: The chance from 0 to 1 of stalling before each
+         frame, like a hiccup in the network.
+        :param stall_length: How many milliseconds a stall lasts.
+        :param drop_chance: The chance from 0 to 1 of skipping a frame before
+         it's sent, which shows up as an upstream drop with protocol 2.
+        :param source: An image or a directory of images to send instead of a
+         test pattern.
+        :param address: The networkzero address to advertise at. Defaults to
+         letting networkzero pick one.
+        :param clock_offset: How many milliseconds our clock is ahead of the
+         viewer's, like a Pi without a real time clock.
+        :param clock_drift: How many parts per million our clock runs fast.
+        """
+        self.name = name
+        self.port = port
+        self.fps = fps
+        self.jitter = jitter
+        self.stall_chance = stall_chance
+        self.stall_length = stall_length
+        self.drop_chance = drop_chance
+        self.source = source
+        self.settings = deepcopy(DEFAULT_SETTINGS)
+        self.settings["resolution"]["selected"] = resolution
+        self.address = address
+        self.clock_offset = clock_offset
+        self.clock_drift = clock_drift
+        self._clock_start = unix()
+        self.frames_sent = 0
+        self._protocol = 1
+        self._settings_version = 0
+        self._negotiated = Event()
+        self._paused = Event()
+        self._frames: list[bytes] = []
+        self._frames_lock = Lock()
+        self._stop_stream: Optional[Event] = None
+        self._make_frames()
+
+    def _make_frames(self) -> None:
+        """
+        Make the frames to send for the selected resolution.
+
+        :return: None.
+        """
+        resolution = tuple(self.settings["resolution"]["selected"])
+        logger.debug(f"Making frames at {resolution[0]}x{resolution[1]}")
+        if self.source is not None:
+            frames = load_frames(self.source, resolution)
+        else:
+            frames = make_synthetic_frames(resolution)
+        with self._frames_lock:
+            self._frames = frames
+            self._resolution = resolution
+
+    def start(self) -> None:
+        """
+        Start advertising and answering messages on a thread.
+
+        :return: None.
+        """
+        self.address = nw0.advertise(self.name, self.address)
+        logger.info(f"Advertising as {repr(self.name)} at {self.address}")
+        t = Thread(target=self.serve, daemon=True)
+        t.start()
+
+    def serve(self) -> None:
+        """
+        Keep answering messages from viewers.
+
+        :return: None.
+        """
+        while True:
+            message = nw0.wait_for_message_from(self.address)
+            nw0.send_reply_to(self.address, self.handle_message(message))
+
+    def handle_message(self, message):
+        """
+        Work out the reply to a message from a viewer.
+
+        :param message: The message.
+        :return: The reply.
+        """
+        if isinstance(message, str):
+            logger.info(f"Viewer at {message} wants to connect")
+            self._protocol = 1
+            self._negotiated.clear()
+            self._paused.clear()
+            self._start_stream(message)
+            return self._settings_reply()
+        if "command" in message:
+            return self.handle_command(message)
+        ok = self.apply_settings(message)
+        return [ok, self._settings_reply()]
+
+    def clock(self) -> float:
+        """
+        Get the time on our pretend clock, which can be off from the real
+        one.
+
+        :return: The time in milliseconds since the epoch.
+        """
+        now = unix()
+        return now * 1000 + self.clock_offset + \
+            (now - self._clock_start) * self.clock_drift / 1000
+
+    def _settings_reply(self) -> dict:
+        """
+        Make a copy of the settings with what we support attached.
+
+        :return: A dict.
+        """
+        reply = deepcopy(self.settings)
+        reply["capabilities"] = {
+            "protocol": [1, PROTOCOL_VERSION],
+            "commands": ["settings_delta", "servo", "pause", "time",
+                         "name"],
+            "settings_version": self._settings_version
+        }
+        return reply
+
+    def handle_command(self, message: dict):
+        """
+        Work out the reply to a command.
+
+        :param message: A dict with the command in the "command" key.
+        :return: The reply.
+        """
+        received = self.clock()
+        command = message["command"]
+        if command == "protocol":
+            self._protocol = min(int(message["version"]), PROTOCOL_VERSION)
+            logger.debug(f"Using protocol version {self._protocol}")
+            self._negotiated.set()
+            return self._protocol
+        if command == "settings_delta":
+            if message["base_version"] != self._settings_version:
+                logger.warning("Settings version mismatch")
+                return {"ok": False, "mismatch": True,
+                        "version": self._settings_version}
+            settings = deepcopy(self.settings)
+            apply_settings_diff(settings, message["changes"])
+            ok = self.apply_settings(settings)
+            return {"ok": ok, "version": self._settings_version}
+        if command == "servo":
+            settings = deepcopy(self.settings)
+            settings["servos"]["pan"]["value"] = message["pan"]
+            settings["servos"]["tilt"]["value"] = message["tilt"]
+            ok = self.apply_settings(settings)
+            return {"ok": ok, "version": self._settings_version}
+        if command == "pause":
+            if message["paused"]:
+                logger.info("Pausing stream")
+                self._paused.set()
+            else:
+                logger.info("Resuming stream")
+                self._paused.clear()
+            return {"ok": True}
+        if command == "time":
+            return {"received": received, "sent": self.clock()}
+        if command == "name":
+            return self.name
+        logger.warning(f"Unknown command {repr(command)}")
+        return None
+
+    def apply_settings(self, settings: dict) -> bool:
+        """
+        Check and apply new settings the way the PiCam does.
+
+        :param settings: The new settings dict.
+        :return: A bool on whether the settings were valid and applied.
+        """
+        try:
+            for key in ("awb_mode", "effect", "iso"):
+                if settings[key]["selected"] not in \
+                        self.settings[key]["available"]:
+                    raise ValueError(f"Invalid {key}")
+            for key in ("brightness", "contrast", "saturation"):
+                if not self.settings[key]["min"] <= settings[key]["value"] \
+                        <= self.settings[key]["max"]:
+                    raise ValueError(f"Invalid {key}")
+            for key in ("pan", "tilt"):
+                servo = self.settings["servos"][key]
+                if not servo["min"] <= settings["servos"][key]["value"] <= \
+                        servo["max"]:
+                    raise ValueError(f"Invalid {key}")
+            width, height = settings["resolution"]["selected"]
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Rejecting settings: {e}")
+            return False
+        old_resolution = tuple(self.settings["resolution"]["selected"])
+        for key in ("awb_mode", "effect", "iso"):
+            self.settings[key]["selected"] = settings[key]["selected"]
+        for key in ("brightness", "contrast", "saturation"):
+            self.settings[key]["value"] = settings[key]["value"]
+        for key in ("pan", "tilt"):
+            self.settings["servos"][key]["value"] = \
+                settings["servos"][key]["value"]
+        self.settings["resolution"]["selected"] = (width, height)
+        self._settings_version += 1
+        if (width, height) != old_resolution:
+            self._make_frames()
+        return True
+
+    def _start_stream(self, viewer_ip: str) -> None:
+        """
+        Stop any old stream and start streaming to a viewer.
+
+        :param viewer_ip: The IP address of the viewer.
+        :return: None.
+        """
+        if self._stop_stream is not None:
+            self._stop_stream.set()
+        self._stop_stream = Event()
+        t = Thread(target=self.stream, args=(viewer_ip, self._stop_stream),
+                   daemon=True)
+        t.start()
+
+    def stream(self, viewer_ip: str, stop: Event) -> None:
+        """
+        Connect back to a viewer and stream frames to it until stopped or
+        the viewer goes away.
+
+        :param viewer_ip: The IP address of the viewer.
+        :param stop: An Event that stops the stream when set.
+        :return: None.
+        """
+        # Give the viewer a moment to negotiate a newer protocol, older
+        # viewers won't so don't wait forever
+        self._negotiated.wait(1)
+        connection = socket()
+        try:
+            connection.connect((viewer_ip, self.port))
+        except OSError as e:
+            logger.warning(f"Failed to connect to viewer: {e}")
+            return
+        logger.info(f"Streaming to {viewer_ip}:{self.port}")
+        sequence = 0
+        next_time = perf_counter()
+        try:
+            while not stop.is_set():
+                if self._paused.is_set():
+                    while self._paused.is_set() and not stop.is_set():
+                        sleep(0.05)
+                    # Send a fresh frame right away instead of catching up
+                    next_time = perf_counter() - 1 / self.fps
+                next_time += 1 / self.fps
+                delay = next_time - perf_counter()
+                if self.jitter > 0:
+                    delay += random.uniform(0, self.jitter) / 1000
+                if random.random() < self.stall_chance:
+                    delay += self.stall_length / 1000
+                if delay > 0:
+                    sleep(delay)
+                sequence += 1
+                if random.random() < self.drop_chance:
+                    continue
+                with self._frames_lock:
+                    payload = self._frames[sequence % len(self._frames)]
+                    width, height = self._resolution
+                frame_time = round(self.clock())
+                if self._protocol >= 2:
+                    header = struct.pack(HEADER_V2_FORMAT, frame_time,
+                                         len(payload), sequence, width,
+                                         height, CODEC_JPEG, 0)
+                else:
+                    header = struct.pack(HEADER_FORMAT, frame_time,
+                                         len(payload))
+                connection.sendall(header + payload)
+                self.frames_sent += 1
+            connection.sendall(struct.pack(HEADER_FORMAT, 0, 0) if
+                               self._protocol < 2 else
+                               struct.pack(HEADER_V2_FORMAT, 0, 0, 0, 0, 0,
+                                           0, 0))
+        except OSError as e:
+            logger.warning(f"Stopped streaming: {e}")
+        finally:
+            connection.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Pretend to be a Remote PiCam.")
+    parser.add_argument("--name", default="picam",
+                        help="the name to advertise as (default: picam)")
+    parser.add_argument("--port", type=int, default=7896,
+                        help="the port the viewer listens on "
+                             "(default: 7896)")
+    parser.add_argument("--address", default=None,
+                        help="the networkzero address to advertise at, "
+                             "like 127.0.0.1:9999 (default: automatic)")
+    parser.add_argument("--fps", type=float, default=30,
+                        help="frames per second (default: 30)")
+    parser.add_argument("--resolution", default="720x480",
+                        help="the starting resolution (default: 720x480)")
+    parser.add_argument("--jitter", type=float, default=0,
+                        help="up to how many milliseconds to randomly delay "
+                             "each frame (default: 0)")
+    parser.add_argument("--stall-chance", type=float, default=0,
+                        help="the chance of stalling before each frame "
+                             "(default: 0)")
+    parser.add_argument("--stall-length", type=float, default=500,
+                        help="how many milliseconds a stall lasts "
+                             "(default: 500)")
+    parser.add_argument("--drop-chance", type=float, default=0,
+                        help="the chance of skipping each frame (default: 0)")
+    parser.add_argument("--source", type=Path, default=None,
+                        help="an image or directory of images to send "
+                             "instead of a test pattern")
+    parser.add_argument("--clock-offset", type=float, default=0,
+                        help="how many milliseconds to set the clock ahead "
+                             "(default: 0)")
+    parser.add_argument("--clock-drift", type=float, default=0,
+                        help="how many parts per million the clock runs "
+                             "fast (default: 0)")
+    args = parser.parse_args()
+    simulator = PiCamSimulator(
+        name=args.name, port=args.port, fps=args.fps,
+        resolution=tuple(int(p) for p in args.resolution.split("x")),
+        jitter=args.jitter, stall_chance=args.stall_chance,
+        stall_length=args.stall_length, drop_chance=args.drop_chance,
+        source=args.source, address=args.address,
+        clock_offset=args.clock_offset, clock_drift=args.clock_drift
+    )
+    simulator.start()
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        logger.info(f"Sent {simulator.frames_sent} frames, exiting")
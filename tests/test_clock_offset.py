@@ -0,0 +1,71 @@
+"""
+Tests that measuring the PiCam's clock offset in the middle of a stream
+doesn't throw frames away as late.
+"""
+
+from io import BytesIO
+from queue import Queue
+from time import time as unix, sleep
+
+from PIL import Image
+
+from clock_sync import ClockSync
+from frame_buffer import FrameBuffer, JITTER_BUFFER
+from frame_pipeline import FramePipeline
+from picam import Frame
+
+OFFSET = 5000
+
+
+class FakePiCam:
+    """
+    Just enough of a RemotePiCam for ClockSync, with a clock OFFSET
+    milliseconds ahead of ours.
+    """
+
+    name = "fake"
+    is_connected = True
+
+    def supports(self, command: str) -> bool:
+        return command == "time"
+
+    def get_time(self, timeout: float) -> tuple[float, float]:
+        now = unix() * 1000 + OFFSET
+        return now, now
+
+
+def make_jpeg() -> bytes:
+    data = BytesIO()
+    Image.new("RGB", (16, 16)).save(data, format="JPEG")
+    return data.getvalue()
+
+
+def test_offset_change_mid_stream():
+    payload = make_jpeg()
+    clock = ClockSync(FakePiCam(), samples=1)
+    frame_buffer = FrameBuffer(policy=JITTER_BUFFER, playout_delay=20)
+    output = Queue()
+    pipeline = FramePipeline(output, input_buffer=frame_buffer)
+    pipeline.start()
+    count = 40
+    for i in range(count):
+        if i == count // 2:
+            # The first offset estimate lands in the middle of the stream
+            assert clock.refresh()
+        frame = Frame(memoryview(payload), len(payload),
+                      round(unix() * 1000 + OFFSET))
+        frame.local_time = clock.to_local(frame.frame_time)
+        pipeline.submit(frame)
+        sleep(0.005)
+    sleep(0.2)
+    pipeline.stop()
+    frames = []
+    while not output.empty():
+        frames.append(output.get())
+    assert pipeline.late_frames == 0
+    assert frame_buffer.late[JITTER_BUFFER] == 0
+    assert len(frames) + frame_buffer.dropped[JITTER_BUFFER] == count
+    times = [frame.frame_time for frame in frames]
+    assert times == sorted(times)
+    # Frames after the offset was measured are in our clock
+    assert abs(unix() * 1000 - frames[-1].local_time) < 1000